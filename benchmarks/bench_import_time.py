@@ -0,0 +1,87 @@
+"""
+Import time of the parts of the project. Every import runs in a fresh interpreter, so nothing is cached:
+
+    modules.parameters     the parameters alone
+    modules._scan          scan strategies, planner and writers (no hardware libraries, no GUI)
+    modules.backend        hardware libraries (msl-equipment, nidaqmx)
+    motor controller       backend.get_motor_controller(): the controller with its initial sensor measurement
+    modules.gui            the Qt stack and the graphs
+
+Reported is the best of the repeats. Pass --importtime to list the slowest modules of every import (python -X
+importtime).
+
+Run from the repository root:
+    python benchmarks/bench_import_time.py
+"""
+
+
+import sys
+import argparse
+import subprocess
+from pathlib import Path
+
+
+root = Path(__file__).resolve().parents[1]
+
+# (name, statement)
+cases = (
+    ('python', 'pass'),
+    ('modules.parameters', 'from modules import parameters'),
+    ('modules._scan', 'from modules import _scan'),
+    ('modules.backend', 'from modules import backend'),
+    ('motor controller', 'from modules import backend; backend.get_motor_controller()'),
+    ('modules.gui', 'from modules import gui'),
+)
+
+timing_script = '''
+import time
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+'''
+
+
+def import_time(statement):
+    """
+    :return: Duration [s] of the statement in a fresh interpreter, or None if it failed (missing package).
+    """
+    result = subprocess.run([sys.executable, '-c', timing_script.format(statement=statement)], cwd=root,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(statement, count):
+    # Slowest modules by their cumulative import time (python -X importtime)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], cwd=root, capture_output=True,
+                            text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        imports.append((int(cumulative), module.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time of the parts of the project.')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per import.')
+    parser.add_argument('--importtime', action='store_true', help='List the slowest modules of every import.')
+    args = parser.parse_args()
+
+    print(f"{'import':<20} {'best [ms]':>10}")
+    for name, statement in cases:
+        durations = [import_time(statement) for _ in range(args.repeat)]
+        if None in durations:
+            print(f"{name:<20} {'failed (missing package?)':>10}")
+            continue
+        print(f"{name:<20} {min(durations) * 1e3:>10.1f}")
+        if args.importtime:
+            for cumulative, module in slowest_imports(statement, 5):
+                print(f"{'':<4}{module:<40} {cumulative / 1e3:>8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Compares the per-point cost of the sample aggregation in MotorController.collect_sensor_data:
+
+    pandas:       the original path, one single-row DataFrame per sample concatenated onto a growing DataFrame.
+    accumulator:  the preallocated NumPy buffer (SampleAccumulator) filled sample by sample and reduced once.
+
+The sensor is replaced by pregenerated readings, so only the aggregation itself is measured.
+
+Run from the repository root:
+    python benchmarks/bench_sample_aggregation.py
+"""
+
+
+import sys
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from modules._sample_statistics import SampleAccumulator  # noqa: E402
+
+
+sample_counts = (100, 500, 1000)
+repeats = 5
+
+
+def pandas_aggregation(readings, positions):
+    # Replica of the original collect_sensor_data loop
+    column_names = ["motor_1_position", "motor_2_position", "motor_3_position", "a0", "a1", "data_ratio"]
+    scan_data_cluster = pd.DataFrame(columns=column_names)
+    for sensor_data in readings:
+        data_n = {
+            "motor_1_position": positions[0],
+            "motor_2_position": positions[1],
+            "motor_3_position": positions[2],
+            "a0": [sensor_data[0]],
+            "a1": [sensor_data[1]],
+            "data_ratio": [sensor_data[2]]}
+        current_scan = pd.DataFrame(data_n)
+        scan_data_cluster = pd.concat((scan_data_cluster, current_scan), axis=0)
+        warnings.simplefilter(action='ignore', category=FutureWarning)
+    return scan_data_cluster.mean()
+
+
+def accumulator_aggregation(readings, positions):
+    accumulator = SampleAccumulator(len(readings))
+    for sensor_data in readings:
+        accumulator.add(positions, sensor_data)
+    return accumulator.summary()
+
+
+def best_time(function, readings, positions):
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(readings, positions)
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    positions = (0.0, 90.0, 60.0)
+    print(f"{'samples':>8} {'pandas [ms/point]':>18} {'accumulator [ms/point]':>23} {'speed-up':>9}")
+    for n in sample_counts:
+        a0 = rng.uniform(42, 70, n)
+        a1 = rng.uniform(71, 420, n)
+        readings = [tuple(row) for row in np.column_stack((a0, a1, a0 / a1))]
+
+        # Both paths have to agree on the six-field summary
+        expected = pandas_aggregation(readings, positions)
+        result = accumulator_aggregation(readings, positions)
+        assert np.allclose(expected.to_numpy(dtype=float), result.iloc[:6].to_numpy(dtype=float))
+
+        pandas_time = best_time(pandas_aggregation, readings, positions)
+        accumulator_time = best_time(accumulator_aggregation, readings, positions)
+        print(f"{n:>8} {pandas_time * 1e3:>18.2f} {accumulator_time * 1e3:>23.3f} "
+              f"{pandas_time / accumulator_time:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+Scan throughput on the simulated hardware.
+
+Runs Scan1D, Scan3D and the calibration against the simulated BSC203 and sensor (see modules/_simulation) with an
+accelerated clock, at several grid sizes and sample counts. Reported for every run:
+
+    points per second:  of the simulated time (what the scan achieves on the hardware) and of the real time (CPU cost)
+    time per phase:     move, settle, acquire, reduce, write... as recorded by MotorController.timer
+    peak memory:        traced by tracemalloc in a separate pass (tracing slows the code down)
+
+The simulated clock is the real clock sped up, so every millisecond of CPU time counts "time scale" milliseconds of
+the simulated time. Keep the time scale low enough (default 100) for the simulated throughput to stay meaningful.
+
+The results are saved as JSON. Pass an earlier result as the baseline to catch regressions of the scan hot path:
+    python benchmarks/bench_scans.py --output new.json --baseline old.json
+
+Run from the repository root:
+    python benchmarks/bench_scans.py
+"""
+
+
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from pathlib import Path
+from datetime import datetime
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from modules import parameters as param  # noqa: E402
+from modules import backend  # noqa: E402
+
+
+# (name, scan type, motor 1, motor 2, motor 3 (from, to, step) [deg], samples per point)
+cases = (
+    ('1D 13 points x 50 samples', '1D', (0, 0, 15), (0, 0, 45), (300, 60, 10), 50),
+    ('1D 13 points x 500 samples', '1D', (0, 0, 15), (0, 0, 45), (300, 60, 10), 500),
+    ('3D 45 points x 50 samples', '3D', (0, 30, 15), (0, 90, 45), (330, 30, 15), 50),
+    ('3D 45 points x 500 samples', '3D', (0, 30, 15), (0, 90, 45), (330, 30, 15), 500),
+    ('3D 325 points x 100 samples', '3D', (0, 60, 15), (0, 180, 45), (300, 60, 10), 100),
+    ('calibration 13 points x 100 samples', 'calibration', (0, 0, 15), (0, 0, 45), (300, 60, 10), 100),
+)
+quick_cases = cases[:1] + cases[2:3] + cases[-1:]
+
+
+class _Signal:
+    # Stands in for the Qt signals of the GUI (progress bar, 2D graph timer).
+    def __init__(self):
+        self.last_value = None
+
+    def emit(self, *values):
+        self.last_value = values
+
+
+def _create_controller(time_scale, motors):
+    controller = backend.MotorController(
+        manufacturer="Thorlabs",
+        model="BSC203",
+        serial="70224414",
+        address="SDK::Thorlabs.MotionControl.Benchtop.StepperMotor.dll",
+        backend=backend.Backend.MSL)
+    controller.clock.set_time_scale(time_scale)
+    controller.sensor.toggle_graph_2D_timer = _Signal()
+    if motors == 'simulated':
+        controller.connect(simulated=True)  # Real _Motor code on the simulated BSC203
+    else:
+        controller.simulate_sensor()  # _VirtualMotor
+        if param.sensor_continuous_acquisition:
+            controller.sensor.start_continuous_acquisition()
+    return controller
+
+
+def run_case(case, time_scale, motors):
+    name, scan_type, motor_1_range, motor_2_range, motor_3_range, samples = case
+    controller = _create_controller(time_scale, motors)
+    try:
+        for motor, (scan_from, scan_to, scan_step) in zip(controller.motors[1:],
+                                                          (motor_1_range, motor_2_range, motor_3_range)):
+            motor.set_measurement_parameters(scan_from=scan_from, scan_to=scan_to, scan_step=scan_step)
+        controller.sensor.set_number_of_measurement_points(samples)
+
+        clock_start = controller.clock.time()
+        real_start = time.perf_counter()
+        if scan_type == 'calibration':
+            controller.calibrate()
+        else:
+            controller.set_scan_type(scan_type)
+            controller.scan(_Signal())
+        clock_duration = controller.clock.time() - clock_start
+        real_duration = time.perf_counter() - real_start
+        points = len(controller.measurement_data)
+        return {
+            'points': points,
+            'samples_per_point': samples,
+            'simulated_duration': clock_duration,
+            'real_duration': real_duration,
+            'points_per_simulated_second': points / clock_duration,
+            'points_per_real_second': points / real_duration,
+            'phases': controller.timer.report(),
+        }
+    finally:
+        controller.disconnect()
+
+
+def peak_memory(case, time_scale, motors):
+    tracemalloc.start()
+    try:
+        run_case(case, time_scale, motors)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def compare(results, baseline, tolerance):
+    """
+    :return: Names of the runs slower than the baseline by more than "tolerance" (relative).
+    """
+    regressions = []
+    baseline_runs = {run['name']: run for run in baseline['runs']}
+    print(f"\n{'run':<40} {'simulated':>10} {'real':>10}   (throughput relative to the baseline)")
+    for run in results['runs']:
+        if run['name'] not in baseline_runs:
+            continue
+        reference = baseline_runs[run['name']]
+        simulated = run['points_per_simulated_second'] / reference['points_per_simulated_second']
+        real = run['points_per_real_second'] / reference['points_per_real_second']
+        regressed = simulated < 1 - tolerance or real < 1 - tolerance
+        print(f"{run['name']:<40} {simulated:>9.2f}x {real:>9.2f}x {'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(run['name'])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scan throughput on the simulated hardware.')
+    parser.add_argument('--time-scale', type=float, default=100, help='Speed-up of the simulated clock.')
+    parser.add_argument('--motors', choices=('simulated', 'virtual'), default='simulated',
+                        help='Real motor code on the simulated BSC203, or the _VirtualMotor stand-ins.')
+    parser.add_argument('--quick', action='store_true', help='Run only the small cases.')
+    parser.add_argument('--output', type=Path, default=Path('benchmarks') / 'results' / 'bench_scans.json')
+    parser.add_argument('--baseline', type=Path, help='Earlier result to compare with.')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed relative drop of the throughput.')
+    args = parser.parse_args()
+
+    results = {
+        'date_utc': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time_scale': args.time_scale,
+        'motors': args.motors,
+        'concurrent_moves': param.concurrent_moves,
+        'continuous_acquisition': param.sensor_continuous_acquisition,
+        'runs': [],
+    }
+    with tempfile.TemporaryDirectory() as output_directory:
+        # Keep the scan output out of DataOutput
+        param.output_path = Path(output_directory)
+        param.output_path_1d = param.output_path / 'data_1D'
+        param.output_path_3d = param.output_path / 'data_3D'
+
+        print(f"{'run':<40} {'points/s sim':>12} {'points/s real':>14} {'move [s]':>9} {'settle [s]':>10} "
+              f"{'acquire [s]':>11} {'reduce [ms]':>11} {'write [ms]':>10} {'peak [MiB]':>10}")
+        for case in (quick_cases if args.quick else cases):
+            run = {'name': case[0], **run_case(case, args.time_scale, args.motors)}
+            run['peak_memory'] = peak_memory(case, args.time_scale, args.motors)
+            results['runs'].append(run)
+
+            phases = run['phases']
+
+            def clock_total(phase):
+                return phases.get(phase, {}).get('clock_total', 0.0)
+
+            def real_total(phase):
+                return phases.get(phase, {}).get('real_total', 0.0)
+
+            print(f"{run['name']:<40} {run['points_per_simulated_second']:>12.3f} "
+                  f"{run['points_per_real_second']:>14.1f} {clock_total('move'):>9.1f} {clock_total('settle'):>10.1f} "
+                  f"{clock_total('acquire'):>11.1f} {real_total('reduce') * 1e3:>11.1f} "
+                  f"{real_total('write') * 1e3:>10.1f} {run['peak_memory'] / 2 ** 20:>10.2f}")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f'\nResults saved into {args.output}')
+
+    if args.baseline is not None:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        if regressions:
+            print(f'{len(regressions)} run(s) slower than the baseline.')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
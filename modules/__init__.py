@@ -1,7 +1,19 @@
-from . import _calibration
-from . import _real_time_graphs
-from . import _scan
-from . import app_logger
-from . import backend
-from . import gui
-from . import parameters
+import importlib
+
+
+# The submodules are imported on first use (PEP 562), so "from modules import parameters" or "modules._scan" don't
+# load the hardware libraries and the GUI (gui, _real_time_graphs) is loaded only by the GUI.
+_submodules = ('_acquisition', '_async_api', '_calibration', '_job_queue', '_kinematics', '_progress',
+               '_real_time_graphs', '_sample_statistics', '_scan', '_scan_config', '_scan_journal', '_scan_pipeline',
+               '_scan_planner', '_scan_timing', '_scan_writer', '_settle', '_simulation', 'app_logger', 'backend', 'gui',
+               'parameters')
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_submodules))
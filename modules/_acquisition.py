@@ -0,0 +1,206 @@
+# System libraries
+import time
+import logging
+import threading
+
+# Math libraries:
+import numpy as np
+
+# Hardware libraries
+import nidaqmx
+from nidaqmx.constants import Edge, AcquisitionType
+from nidaqmx.stream_readers import AnalogMultiChannelReader
+
+# Custom modules:
+from modules import parameters as param
+from modules.app_logger import log_this
+
+
+logger = logging.getLogger(__name__)
+
+
+class RingBuffer:
+    """
+    Fixed size circular buffer holding the most recent samples of every channel.
+    Samples are addressed by their absolute index (number of samples acquired before them), so a reader can ask for
+    the samples acquired after a given moment without copying the whole buffer.
+    """
+
+    def __init__(self, number_of_channels: int, capacity: int):
+        self.number_of_channels = number_of_channels
+        self.capacity = int(capacity)
+        self._data = np.zeros((number_of_channels, self.capacity))
+        self._new_data = threading.Condition()
+        self.total_written = 0  # Absolute index of the next sample. Never wraps.
+
+    def write(self, block):
+        """
+        Appends a block of samples to the buffer.
+
+        :param block: Array of shape (number_of_channels, n).
+        :return: None.
+        """
+        acquired = block.shape[1]
+        block = block[:, -self.capacity:]  # Older samples would be overwritten anyway
+        n = block.shape[1]
+        with self._new_data:
+            start = (self.total_written + acquired - n) % self.capacity
+            first_part = min(n, self.capacity - start)
+            self._data[:, start:start + first_part] = block[:, :first_part]
+            self._data[:, :n - first_part] = block[:, first_part:]
+            self.total_written += acquired
+            self._new_data.notify_all()
+
+    def wait_for(self, count, timeout=None):
+        """
+        Blocks until at least "count" samples have been written since the start.
+
+        :return: True if the samples are available, False if the timeout expired.
+        """
+        with self._new_data:
+            return self._new_data.wait_for(lambda: self.total_written >= count, timeout=timeout)
+
+    def read(self, start, stop):
+        """
+        Returns a copy of the samples with absolute indices start <= index < stop.
+
+        :return: Array of shape (number_of_channels, stop - start).
+        """
+        with self._new_data:
+            if stop > self.total_written:
+                raise ValueError(f'Samples up to {stop} were requested, but only {self.total_written} were acquired.')
+            if start < self.total_written - self.capacity:
+                raise ValueError(f'Samples from {start} were already overwritten. Increase the buffer size.')
+            indices = np.arange(start, stop) % self.capacity
+            return self._data[:, indices]
+
+    def latest(self):
+        with self._new_data:
+            if self.total_written == 0:
+                return None
+            return self._data[:, (self.total_written - 1) % self.capacity].copy()
+
+
+class ContinuousAcquisition:
+    """
+    Long-lived hardware-timed acquisition of the sensor channels.
+    The DAQ streams continuously into the ring buffer, so asking for N samples only waits for them to arrive and slices
+    the buffer instead of creating, configuring and closing a new nidaqmx.Task for every reading.
+    """
+
+    def __init__(self, channels=param.sensor_channels, sampling_rate=param.sensor_sampling_rate,
+                 buffer_size=param.sensor_buffer_size, read_chunk=param.sensor_read_chunk):
+        self.channels = channels
+        self.sampling_rate = sampling_rate
+        self.buffer_size = buffer_size
+        self.read_chunk = read_chunk
+        self.buffer = RingBuffer(2, buffer_size)  # a0, a1
+        self.start_time = None  # time.perf_counter() at the moment the first sample was acquired
+        self._task = None
+        self._reader = None
+        self._chunk = np.zeros((2, read_chunk))
+        self._error = None
+        self._recording = None  # List of (first sample index, block) while recording
+
+    def __repr__(self):
+        return f'Continuous acquisition {self.channels} [{self.sampling_rate} Hz]'
+
+    @property
+    def is_running(self):
+        return self._task is not None
+
+    @log_this
+    def start(self):
+        self._task = nidaqmx.Task()
+        try:
+            self._task.ai_channels.add_ai_voltage_chan(self.channels)
+            self._task.timing.cfg_samp_clk_timing(
+                self.sampling_rate,
+                source="",
+                active_edge=Edge.RISING,
+                sample_mode=AcquisitionType.CONTINUOUS,
+                samps_per_chan=self.buffer_size,
+            )
+            self._reader = AnalogMultiChannelReader(self._task.in_stream)
+            self._task.register_every_n_samples_acquired_into_buffer_event(self.read_chunk, self._on_samples_acquired)
+            self._task.start()
+        except nidaqmx.DaqError:
+            self._task.close()
+            self._task = None
+            raise
+        self.start_time = time.perf_counter()
+        logger.info(f'{log_this.space}Continuous acquisition of {self.channels} started.')
+
+    @log_this
+    def stop(self):
+        if self._task is not None:
+            self._task.stop()
+            self._task.close()
+            self._task = None
+        logger.info(f'{log_this.space}Continuous acquisition of {self.channels} stopped.')
+
+    def _on_samples_acquired(self, task_handle, every_n_samples_event_type, number_of_samples, callback_data):
+        # Runs in the nidaqmx callback thread. Exceptions can't propagate from here, so keep them for the reader.
+        try:
+            self._reader.read_many_sample(self._chunk, number_of_samples_per_channel=number_of_samples, timeout=0)
+            self._store_block(self._chunk[:, :number_of_samples])
+        except nidaqmx.DaqError as e:
+            self._error = e
+        return 0
+
+    def _store_block(self, block):
+        # block: array of shape (2, n) with the a0 and a1 samples
+        if self._recording is not None:
+            self._recording.append((self.buffer.total_written, block.copy()))
+        self.buffer.write(block)
+
+    def sample_time(self, index):
+        # The acquisition is hardware-timed, so the time of every sample follows from its index.
+        return self.start_time + np.asarray(index) / self.sampling_rate
+
+    def mark(self):
+        # Absolute index of the next sample to be acquired.
+        return self.buffer.total_written
+
+    def read(self, number_of_samples, start=None):
+        """
+        Waits for "number_of_samples" samples acquired after "start" (by default after this call) and returns them.
+
+        :return: Array of shape (number_of_samples, 3) with the columns a0, a1, data_ratio.
+        """
+        start = self.mark() if start is None else start
+        stop = start + number_of_samples
+        timeout = number_of_samples / self.sampling_rate + 1  # Generous margin for the driver transfer
+        if not self.buffer.wait_for(stop, timeout=timeout) or self._error is not None:
+            raise self._error if self._error is not None else TimeoutError('Sensor stopped delivering samples.')
+        return self._to_samples(self.buffer.read(start, stop))
+
+    def start_recording(self):
+        # Keeps every acquired sample (not only the ring buffer capacity) until stop_recording(), e.g. during a sweep.
+        self._recording = []
+
+    def stop_recording(self):
+        """
+        :return: Absolute indices of the recorded samples and an array of shape (n, 3) with a0, a1, data_ratio.
+        """
+        recording = self._recording
+        self._recording = None
+        if not recording:
+            return np.empty(0, dtype=int), np.empty((0, 3))
+        indices = np.concatenate([np.arange(start, start + block.shape[1]) for start, block in recording])
+        samples = self._to_samples(np.concatenate([block for _, block in recording], axis=1))
+        return indices, samples
+
+    def latest(self):
+        sample = self.buffer.latest()
+        if sample is None:
+            return None
+        return self._to_samples(sample.reshape(2, 1))[0]
+
+    @staticmethod
+    def _to_samples(block):
+        samples = np.empty((block.shape[1], 3))
+        samples[:, 0] = block[0]
+        samples[:, 1] = block[1]
+        samples[:, 2] = block[0] / block[1]
+        return samples
@@ -0,0 +1,175 @@
+"""
+Asyncio facade over MotorController, _Motor and Sensor.
+
+The hardware calls stay blocking and run in executors: every motor has its own single worker (the calls to one
+channel keep their order, the channels run side by side) and so has the sensor. Coroutines of different motors and of
+the sensor can be awaited together:
+
+    async with AsyncMotorController(controller) as hardware:
+        await hardware.connect()
+        await asyncio.gather(hardware.motor_1.move_to(30), hardware.motor_3.move_to(330))
+        samples = await hardware.sensor.acquire(500)
+"""
+
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from modules import parameters as param
+from modules.app_logger import log_this
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMotor:
+    """
+    Awaitable moves of one motor. The motor is looked up at every call, so the facade follows MotorController.connect()
+    replacing the virtual motors by the real ones.
+    """
+
+    def __init__(self, controller, motor_id, executor):
+        self._controller = controller
+        self.motor_id = motor_id
+        self._executor = executor
+
+    def __repr__(self):
+        return f'Async motor {self.motor_id}'
+
+    @property
+    def motor(self):
+        return self._controller.motors[self.motor_id]
+
+    @property
+    def position(self):
+        # [deg] Last known position, without asking the controller
+        return self.motor.current_position
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def move_to(self, position):
+        """
+        :param position: Target position [deg].
+        :return: Result of _Motor.move_to_position (1 if the motor is stopped).
+        """
+        return await self._run(self.motor.move_to_position, position)
+
+    async def home(self, velocity=10):
+        return await self._run(self.motor.home, velocity)
+
+    async def get_position(self):
+        return await self._run(self.motor.get_position)
+
+    async def set_velocity(self, velocity, acceleration):
+        return await self._run(self.motor.set_velocity, velocity, acceleration)
+
+    async def stop(self):
+        # Not queued behind the running move of the motor, which it has to interrupt
+        return await asyncio.get_running_loop().run_in_executor(None, self.motor.stop)
+
+
+class AsyncSensor:
+    """
+    Awaitable measurements of the sensor.
+    """
+
+    def __init__(self, sensor, executor):
+        self.sensor = sensor
+        self._executor = executor
+
+    def __repr__(self):
+        return 'Async sensor'
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def acquire(self, number_of_samples=None):
+        """
+        :param number_of_samples: How many samples to measure. The number of measurement points of the sensor if None.
+        :return: Array of shape (number_of_samples, 3) with the columns a0, a1, data_ratio (see Sensor.measure_samples).
+        """
+        if number_of_samples is None:
+            number_of_samples = self.sensor.number_of_measurement_points
+        return await self._run(self.sensor.measure_samples, number_of_samples)
+
+    async def measure(self):
+        # One measurement: a0, a1, data_ratio
+        return await self._run(self.sensor.measure_scattering)
+
+
+class AsyncMotorController:
+    """
+    Awaitable facade of a MotorController. Close it (or use "async with") to shut the executors down.
+    """
+
+    def __init__(self, controller):
+        self.controller = controller
+        # One worker per motor and one for the sensor
+        self._motor_executors = {motor_id: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'motor-{motor_id}')
+                                 for motor_id in (1, 2, 3)}
+        self._sensor_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sensor')
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='controller')
+        self.motor_1, self.motor_2, self.motor_3 = (AsyncMotor(controller, motor_id, executor)
+                                                    for motor_id, executor in self._motor_executors.items())
+        self.motors = [None, self.motor_1, self.motor_2, self.motor_3]
+        self.sensor = AsyncSensor(controller.sensor, self._sensor_executor)
+
+    def __repr__(self):
+        return f'Async {self.controller}'
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        for executor in (*self._motor_executors.values(), self._sensor_executor, self._executor):
+            executor.shutdown(wait=True)
+
+    async def _run(self, function, *args):
+        # Calls of the whole controller (connecting, scans) run on their own worker
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def connect(self, simulated=param.simulate_hardware):
+        return await self._run(self.controller.connect, simulated)
+
+    async def disconnect(self):
+        return await self._run(self.controller.disconnect)
+
+    async def move_all(self, targets):
+        """
+        Moves the motors at the same time.
+
+        :param targets: Target positions of the motors 1, 2, 3. None keeps the motor where it is.
+        :return: List of move_to results of the motors 1, 2, 3 (None for the motors which did not move).
+        """
+        moves = [motor.move_to(target) if target is not None else asyncio.sleep(0)
+                 for motor, target in zip(self.motors[1:], targets)]
+        return await asyncio.gather(*moves)
+
+    async def home_all(self):
+        return await asyncio.gather(*(motor.home() for motor in self.motors[1:]))
+
+    async def stop_motors(self):
+        # Not queued behind the running moves, which it has to interrupt
+        return await asyncio.get_running_loop().run_in_executor(None, self.controller.stop_motors)
+
+    async def measure_point(self, point, number_of_samples=None):
+        """
+        Moves to a point and measures it.
+
+        :param point: Positions of the motors 1, 2, 3. None keeps the motor where it is.
+        :return: Samples of the point (see AsyncSensor.acquire).
+        """
+        await self.move_all(point)
+        logger.info(f'{log_this.space}Measuring at {point}')
+        return await self.sensor.acquire(number_of_samples)
+
+    async def scan(self, thread_signal_progress_status):
+        return await self._run(self.controller.scan, thread_signal_progress_status)
+
+    async def calibrate(self):
+        return await self._run(self.controller.calibrate)
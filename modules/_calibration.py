@@ -1,4 +1,5 @@
 import logging
+from modules import parameters as param
 from modules.app_logger import log_this
 
 
@@ -10,13 +11,22 @@ def calibration(controller):
     motor_1 = controller.motor_1
     motor_2 = controller.motor_2
     motor_3 = controller.motor_3
+    timer = controller.timer
 
-    motor_1.move_to_position(motor_1.scan_from)
-    motor_2.move_to_position(motor_2.scan_from)
-    motor_3.move_to_position(motor_3.scan_from)
+    with timer.measure('move'):
+        if param.concurrent_moves:
+            controller.move_all((motor_1.scan_from, motor_2.scan_from, motor_3.scan_from))
+        else:
+            motor_1.move_to_position(motor_1.scan_from)
+            motor_2.move_to_position(motor_2.scan_from)
+            motor_3.move_to_position(motor_3.scan_from)
     logger.info(f'{log_this.space}Motors in position.')
 
     for step in motor_3.scan_positions:
-        motor_3.move_to_position(step)
-        controller.collect_sensor_data()
+        with timer.measure('move'):
+            motor_3.move_to_position(step)
+        with timer.measure('acquire'):
+            samples = controller.acquire_sensor_samples()
+        with timer.measure('reduce'):
+            controller.reduce_sensor_data(samples)
     logger.info(f'{log_this.space}Calibration finished.')
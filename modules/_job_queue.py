@@ -0,0 +1,211 @@
+import os
+import json
+import logging
+from pathlib import Path
+from datetime import datetime
+
+from modules import parameters as param
+from modules import _scan_config
+from modules import _scan_planner
+from modules.app_logger import log_this
+
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """
+    One scan of the job queue: the scan description (see _scan_config.validate_scan_config()), its priority and an
+    optional calibration run before the scan. Homing before the scan is the "home" key of the scan description.
+        pending  ... waits in the queue
+        running  ... the scan is running (a job found running after a restart of the program is pending again)
+        done     ... all the points were measured
+        stopped  ... the motors were stopped. A step scan can be resumed from its journal.
+        failed   ... the scan raised an error
+    """
+
+    def __init__(self, job_id, config, priority=0, calibration=None, state='pending', created=None, started=None,
+                 finished=None, error=None, journal=None):
+        self.job_id = job_id
+        self.config = config
+        self.priority = priority  # Higher first
+        self.calibration = calibration  # Calibration description run before the scan, None for no calibration
+        self.state = state
+        self.created = created if created is not None else datetime.utcnow().isoformat()
+        self.started = started
+        self.finished = finished
+        self.error = error
+        self.journal = journal  # Journal of the scan, to resume a stopped or failed job
+
+    def __repr__(self):
+        return f'Job {self.job_id} ({self.config["scan_type"]}, priority {self.priority}, {self.state})'
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, record):
+        return cls(**record)
+
+
+class JobQueue:
+    """
+    Jobs saved in a JSON file, so a batch of scans survives a restart of the program. The file is rewritten (and synced
+    to the disk) on every change.
+    The next job is the pending one with the highest priority. From the jobs of the same priority the one whose first
+    point is the quickest to reach from the current motor positions goes first (see next_job()).
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.jobs = []
+        if self.path.exists():
+            self.load()
+
+    def __repr__(self):
+        return f'Job queue {self.path}: {len(self.pending())} pending of {len(self.jobs)}'
+
+    def load(self):
+        with open(self.path, encoding='utf-8') as file:
+            self.jobs = [Job.from_dict(record) for record in json.load(file)['jobs']]
+        for job in self.jobs:
+            if job.state == 'running':
+                # The program ended during the job
+                logger.info(f'{log_this.space}{job} was interrupted. Queued again.')
+                job.state = 'pending'
+
+    def save(self):
+        # Write a new file and replace the old one, so a crash can't leave a half-written queue behind
+        temporary_path = self.path.with_name(self.path.name + '.tmp')
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump({'jobs': [job.to_dict() for job in self.jobs]}, file, indent=2, default=str)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self.path)
+
+    def add(self, config, priority=0, calibration=None):
+        """
+        :param config: Scan description (see _scan_config.validate_scan_config()).
+        :param priority: Jobs with a higher priority run first.
+        :param calibration: Calibration description (motor ranges, samples) run before the scan. None for no
+            calibration.
+        :return: The new Job.
+        :raise ValueError: If a description is not valid.
+        """
+        config = _scan_config.validate_scan_config(dict(config))
+        if calibration is not None:
+            calibration = _scan_config.validate_scan_config(dict(calibration, scan_type='calibration'))
+        job_id = max((job.job_id for job in self.jobs), default=0) + 1
+        job = Job(job_id, config, priority, calibration)
+        self.jobs.append(job)
+        self.save()
+        logger.info(f'{log_this.space}Added {job}')
+        return job
+
+    def remove(self, job_id):
+        self.jobs = [job for job in self.jobs if job.job_id != job_id]
+        self.save()
+
+    def pending(self, simulated=None):
+        """
+        :param simulated: True for the jobs of the simulated hardware only, False for the jobs of the hardware only,
+            None for all of them.
+        """
+        return [job for job in self.jobs if job.state == 'pending' and
+                (simulated is None or job.config['simulated'] == simulated)]
+
+    def next_job(self, controller, simulated=None):
+        """
+        :param controller: MotorController, for the current motor positions and velocities.
+        :param simulated: Pick only from the jobs of the simulated hardware (True) or of the hardware (False).
+        :return: The pending job to run next, None if there is none.
+        """
+        pending = self.pending(simulated)
+        if not pending:
+            return None
+        top_priority = max(job.priority for job in pending)
+        candidates = [job for job in pending if job.priority == top_priority]
+        motors = controller.motors[1:]
+        model = _scan_planner.MoveTimeModel(motors)
+        current_position = tuple(motor.current_position for motor in motors)
+
+        def first_move_time(job):
+            # A homed job starts at home, a calibrated one at the start of its calibration
+            start = (0.0, 0.0, 0.0) if job.config['home'] else current_position
+            first_config = job.calibration if job.calibration is not None else job.config
+            return model.step_time(start, _scan_config.start_position(first_config))
+
+        return min(candidates, key=lambda job: (first_move_time(job), job.job_id))
+
+    def start(self, job):
+        job.state = 'running'
+        job.started = datetime.utcnow().isoformat()
+        job.error = None
+        self.save()
+
+    def finish(self, job, state, error=None, journal=None):
+        job.state = state
+        job.finished = datetime.utcnow().isoformat()
+        job.error = error
+        job.journal = journal
+        self.save()
+
+
+def run_job(controller, job, thread_signal_progress_status):
+    """
+    Homes the motors (if the scan description asks for it), runs the calibration (if any) and the scan of the job.
+
+    :return: None
+    """
+    if job.config['home']:
+        for motor in controller.motors[1:]:
+            motor.home()
+    if job.calibration is not None:
+        _scan_config.apply_scan_config(controller, job.calibration)
+        controller.calibrate()
+    _scan_config.apply_scan_config(controller, job.config)
+    if job.config['scan_type'] == 'calibration':
+        controller.calibrate()
+    else:
+        controller.scan(thread_signal_progress_status)
+
+
+def run_jobs(controller, queue, thread_signal_progress_status, simulated=param.simulate_hardware):
+    """
+    Runs the pending jobs one after another until the queue is empty or the motors are stopped. A failed job is
+    recorded and the queue goes on with the next one.
+    Only the jobs of the connection run: the simulated ones on the simulated hardware, the others on the hardware. The
+    rest stays pending, so a job meant for the hardware never "finishes" with simulated data.
+
+    :param simulated: The controller is connected to the simulated hardware.
+    :return: Dictionary {state: number of the jobs run in this call which ended in the state}.
+    """
+    results = {'done': 0, 'stopped': 0, 'failed': 0}
+    while True:
+        job = queue.next_job(controller, simulated)
+        if job is None:
+            break
+        logger.info(f'{log_this.space}Starting {job}')
+        queue.start(job)
+        # Forget the journal of the previous job, so a job ending before its scan starts does not record it
+        controller.scan_strategy.journal = None
+        state, error = 'done', None
+        try:
+            run_job(controller, job, thread_signal_progress_status)
+            if controller.motors_stopped():
+                state = 'stopped'
+        except KeyboardInterrupt:
+            state = 'stopped'
+            raise
+        except Exception as e:
+            logger.exception(f'{log_this.space}{job} failed: {e}')
+            state, error = 'failed', str(e)
+        finally:
+            journal = controller.scan_strategy.journal  # Fly scans and calibrations have none
+            queue.finish(job, state, error, str(journal.path) if journal is not None and state != 'done' else None)
+            results[state] += 1
+            logger.info(f'{log_this.space}{job}')
+        if state == 'stopped':
+            logger.info(f'{log_this.space}The motors were stopped. Leaving the job queue.')
+            break
+    return results
@@ -0,0 +1,41 @@
+import math
+
+import numpy as np
+
+
+def trapezoidal_move_time(distance, velocity, acceleration):
+    """
+    Duration [s] of a move with a trapezoidal velocity profile: accelerate to "velocity", cruise, decelerate to zero.
+    Moves too short to reach the full velocity follow a triangular profile. Accepts numpy arrays.
+
+    :param distance: [deg]
+    :param velocity: [deg/s]
+    :param acceleration: [deg/s/s]
+    """
+    distance = np.abs(np.asarray(distance, dtype=float))
+    ramp_distance = velocity ** 2 / acceleration  # Distance needed to accelerate to the full velocity and to stop
+    trapezoidal = distance / velocity + velocity / acceleration
+    triangular = 2 * np.sqrt(distance / acceleration)
+    move_time = np.where(distance >= ramp_distance, trapezoidal, triangular)
+    return move_time if move_time.ndim else float(move_time)
+
+
+def trapezoidal_distance(elapsed_time, distance, velocity, acceleration):
+    """
+    :return: Distance [deg] travelled after "elapsed_time" [s] of a move of "distance" [deg] (always >= 0).
+    """
+    distance = abs(distance)
+    duration = trapezoidal_move_time(distance, velocity, acceleration)
+    if elapsed_time >= duration:
+        return distance
+    if elapsed_time <= 0:
+        return 0.0
+    peak_velocity = min(velocity, math.sqrt(distance * acceleration))
+    ramp_time = peak_velocity / acceleration
+    ramp_distance = peak_velocity ** 2 / (2 * acceleration)
+    if elapsed_time < ramp_time:
+        return acceleration * elapsed_time ** 2 / 2  # Accelerating
+    if elapsed_time <= duration - ramp_time:
+        return ramp_distance + peak_velocity * (elapsed_time - ramp_time)  # Cruising
+    remaining_time = duration - elapsed_time
+    return distance - acceleration * remaining_time ** 2 / 2  # Decelerating
@@ -0,0 +1,118 @@
+import math
+
+import numpy as np
+
+from modules import parameters as param
+
+
+phases = ('inner_move', 'outer_move', 'acquisition')
+
+
+class _PhaseStatistics:
+    """
+    Exponentially weighted mean and variance of the ratio measured / estimated duration of one phase.
+    The ratio starts at 1 (the estimate is right) with the weight of "prior_points" points, so the first unusual points
+    can't throw the prediction off, and then follows the newest points with the weight "smoothing".
+    """
+
+    def __init__(self, smoothing, prior_points, prior_relative_std):
+        self.smoothing = smoothing
+        self.prior_points = prior_points
+        self.mean = 1.0
+        self.variance = prior_relative_std ** 2
+        self.count = 0
+
+    def __repr__(self):
+        return f'{round(self.mean, 3)} +- {round(math.sqrt(self.variance), 3)} ({self.count} points)'
+
+    def add(self, measured, estimated):
+        if estimated <= 0:
+            return  # Nothing to compare with (e.g. the motors were already in position)
+        weight = max(self.smoothing, 1 / (self.count + 1 + self.prior_points))
+        difference = measured / estimated - self.mean
+        self.mean += weight * difference
+        self.variance = (1 - weight) * (self.variance + weight * difference ** 2)
+        self.count += 1
+
+    @property
+    def effective_count(self):
+        # Number of points the exponentially weighted mean effectively averages
+        return min(self.count + self.prior_points, 2 / self.smoothing - 1)
+
+
+class ProgressEstimator:
+    """
+    Predicts the remaining time of a scan from its remaining plan and the measured durations of its phases:
+        inner_move   ... moves of motor 3 only (the inner loop of the scan)
+        outer_move   ... moves of motor 1 or 2 (slow, once per pass of motor 3)
+        acquisition  ... measuring a point
+    Every point of the plan gets its estimated phase durations (MoveTimeModel and the acquisition estimate). The
+    measured points correct every phase by its own ratio measured / estimated, so the prediction follows the real
+    hardware while still knowing where the long outer moves are in the remaining plan.
+    The confidence band combines the uncertainty of the ratios and the scatter of the single points.
+    """
+
+    def __init__(self, plan, model, acquisition_time, first_point=0, start=None, smoothing=param.progress_smoothing,
+                 prior_points=param.progress_prior_points, prior_relative_std=param.progress_prior_relative_std,
+                 confidence=param.progress_confidence):
+        """
+        :param plan: ScanPlan of the scan.
+        :param model: MoveTimeModel of the motors.
+        :param acquisition_time: Estimated duration [s] of measuring a point.
+        :param first_point: Index of the first point to measure (points before it are done).
+        :param start: Motor positions before the first point. The first move is not estimated if None.
+        :param confidence: Half-width of the confidence band in standard deviations.
+        """
+        self.confidence = confidence
+        self.statistics = {phase: _PhaseStatistics(smoothing, prior_points, prior_relative_std) for phase in phases}
+        estimates = {phase: np.zeros(len(plan)) for phase in phases}
+        self._outer_move = np.zeros(len(plan), dtype=bool)
+        previous_point = tuple(start) if start is not None else None
+        for index in range(first_point, len(plan)):
+            point = plan[index]
+            if previous_point is not None:
+                self._outer_move[index] = point[0] != previous_point[0] or point[1] != previous_point[1]
+                move_phase = 'outer_move' if self._outer_move[index] else 'inner_move'
+                estimates[move_phase][index] = model.step_time(previous_point, point)
+            previous_point = point
+        estimates['acquisition'][first_point:] = acquisition_time
+        self._estimates = estimates
+        # Remaining estimates after every number of completed points: remaining[phase][k] = sum(estimates[phase][k:])
+        self._remaining = {phase: np.concatenate((np.cumsum(estimate[::-1])[::-1], [0.0]))
+                           for phase, estimate in estimates.items()}
+        self._remaining_squares = {phase: np.concatenate((np.cumsum(estimate[::-1] ** 2)[::-1], [0.0]))
+                                   for phase, estimate in estimates.items()}
+        self._first_point = first_point
+
+    def __repr__(self):
+        return 'Progress estimator: ' + ', '.join(f'{phase} {statistics}'
+                                                  for phase, statistics in self.statistics.items())
+
+    def estimated_duration(self):
+        # Pre-flight estimate [s] of the points still to measure
+        return float(sum(remaining[self._first_point] for remaining in self._remaining.values()))
+
+    def record(self, index, move_duration, acquisition_duration):
+        """
+        :param index: Index of the measured point in the plan.
+        :param move_duration: Measured duration [s] of the move to the point (including the settle time).
+        :param acquisition_duration: Measured duration [s] of the acquisition.
+        """
+        move_phase = 'outer_move' if self._outer_move[index] else 'inner_move'
+        self.statistics[move_phase].add(move_duration, self._estimates[move_phase][index])
+        self.statistics['acquisition'].add(acquisition_duration, self._estimates['acquisition'][index])
+
+    def remaining_time(self, completed):
+        """
+        :param completed: Number of the points of the plan already measured.
+        :return: Predicted remaining time [s] and the half-width of its confidence band [s].
+        """
+        remaining_time = 0.0
+        variance = 0.0
+        for phase, statistics in self.statistics.items():
+            remaining = self._remaining[phase][completed]
+            remaining_time += statistics.mean * remaining
+            # Uncertainty of the mean ratio (systematic) plus the scatter of the remaining points (random)
+            variance += statistics.variance * (remaining ** 2 / statistics.effective_count
+                                               + self._remaining_squares[phase][completed])
+        return float(remaining_time), float(self.confidence * math.sqrt(variance))
@@ -0,0 +1,91 @@
+# Math libraries:
+import numpy as np
+
+
+position_columns = ["motor_1_position", "motor_2_position", "motor_3_position"]
+sample_columns = ["a0", "a1", "data_ratio"]
+summary_columns = position_columns + sample_columns + ["a0_std", "a1_std", "data_ratio_std", "sample_count"]
+
+
+class SampleAccumulator:
+    """
+    Preallocated buffer for the samples measured at one scan position.
+    Samples are filled in one by one (or block by block) and reduced only once by summary().
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = int(capacity)
+        # Columns: motor_1_position, motor_2_position, motor_3_position, a0, a1, data_ratio
+        self._data = np.empty((self.capacity, 6))
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, positions, sample):
+        """
+        :param positions: Positions of the motors 1, 2, 3 at the time of the sample.
+        :param sample: Sensor reading (a0, a1, data_ratio).
+        :return: None.
+        """
+        row = self._data[self.count]
+        row[:3] = positions
+        row[3:] = sample
+        self.count += 1
+
+    def add_block(self, positions, samples):
+        """
+        :param positions: Positions of the motors 1, 2, 3 valid for the whole block.
+        :param samples: Array of shape (n, 3) with the columns a0, a1, data_ratio.
+        :return: None.
+        """
+        n = len(samples)
+        block = self._data[self.count:self.count + n]
+        block[:, :3] = positions
+        block[:, 3:] = samples
+        self.count += n
+
+    @property
+    def samples(self):
+        # View of the sensor readings measured so far.
+        return self._data[:self.count, 3:]
+
+    def relative_standard_error(self):
+        """
+        :return: Standard error of the mean divided by the absolute mean for the columns a0 and data_ratio.
+        """
+        if self.count < 2:
+            return np.array([np.inf, np.inf])
+        readings = self._data[:self.count, [3, 5]]
+        standard_error = readings.std(axis=0, ddof=1) / np.sqrt(self.count)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return standard_error / np.abs(readings.mean(axis=0))
+
+    def is_precise(self, target_relative_error):
+        return bool(np.all(self.relative_standard_error() <= target_relative_error))
+
+    def summary(self):
+        """
+        Reduces the collected samples to the mean of every column, the standard deviation of the readings and the
+        number of samples.
+
+        Example of summary:
+        motor_1_position       0.0
+        motor_2_position      90.0
+        motor_3_position      60.0
+        a0                55.614
+        a1                249.95
+        data_ratio           0.277
+        a0_std             8.121
+        a1_std            99.853
+        data_ratio_std     0.143
+        sample_count       500.0
+
+        :return: pd.Series indexed by summary_columns.
+        """
+        import pandas as pd  # Imported on first use, it takes long to import
+
+        data = self._data[:self.count]
+        mean = data.mean(axis=0)
+        std = data[:, 3:].std(axis=0, ddof=1 if self.count > 1 else 0)
+        return pd.Series(np.concatenate((mean, std, [self.count])), index=summary_columns)
@@ -1,10 +1,17 @@
 # System libraries
-import time
 import logging
 
 from datetime import timedelta, datetime
 
+import numpy as np
+
 import modules.parameters as param
+from modules import _scan_planner
+from modules import _scan_pipeline
+from modules import _scan_writer
+from modules import _scan_journal
+from modules import _progress
+from modules import _sample_statistics
 from modules.app_logger import log_this
 from utils.time_format_processing import days_hours_minutes_seconds
 
@@ -14,9 +21,18 @@ logger = logging.getLogger(__name__)
 class Scan:
     def __init__(self, controller):
         self.controller = controller
+        self.scan_type = self.__class__.__name__  # Recorded in the metadata and the journal
         self.output_path = param.output_path
         self._create_output_dirs()
         self.file_name = None
+        self.writer = None  # ScanWriterGroup of the running scan
+        self.metadata = None  # Scan description stored with the output and the journal
+        self.journal = None  # ScanJournal of the running scan
+        self._resume_state = None  # JournalState of an interrupted scan to continue
+        # Progress of the running scan (see _start_progress)
+        self._scan_start_time = None
+        self._first_point = 0
+        self.progress_estimator = None  # ProgressEstimator of the running scan
         self.motor_1 = controller.motor_1
         self.motor_2 = controller.motor_2
         self.motor_3 = controller.motor_3
@@ -27,29 +43,122 @@ class Scan:
         param.output_path_1d.mkdir(exist_ok=True)
         param.output_path_3d.mkdir(exist_ok=True)
 
-    def _save_to_file(self, data):
-        # Write into file:
-        with open(f'{self.output_path}/{self.file_name}', "a") as f:
-            line = "{};{};{};{};{};{}".format(
-                data.iloc[0], data.iloc[1], data.iloc[2], data.iloc[3], data.iloc[4], data.iloc[5], 3)
-            print(line, file=f)
+    def _metadata(self):
+        # Scan description stored with the binary output formats
+        motors = (self.motor_1, self.motor_2, self.motor_3)
+        metadata = {
+            'scan_type': self.scan_type,
+            'start_time_utc': datetime.utcnow().isoformat(),
+            'number_of_measurement_points': self.controller.sensor.number_of_measurement_points,
+            'adaptive_sampling': self.controller.sensor.adaptive_sampling,
+        }
+        for motor in motors:
+            velocity, acceleration = motor.get_velocity()
+            metadata.update({
+                f'motor_{motor.motor_id}_scan_from': float(motor.scan_from),
+                f'motor_{motor.motor_id}_scan_to': float(motor.scan_to),
+                f'motor_{motor.motor_id}_scan_step': float(motor.scan_step),
+                f'motor_{motor.motor_id}_scan_positions': [float(position) for position in motor.scan_positions],
+                f'motor_{motor.motor_id}_velocity': float(velocity),
+                f'motor_{motor.motor_id}_acceleration': float(acceleration),
+            })
+        return metadata
 
-    @staticmethod
-    def _update_progressbar(progress_count, start_time, full_range, thread_signal_progress_status):
+    def _create_writer(self):
+        state = self._resume_state
+        if state is not None:
+            # Continue appending to the output of the interrupted scan
+            self.file_name = state.file_name
+            self.metadata = state.metadata
+            self.writer = _scan_writer.create_scan_writer(self.output_path / self.file_name, formats=state.formats,
+                                                          metadata=self.metadata)
+            self.writer.restore(state.outputs or {output_format: {'rows': 0} for output_format in state.formats})
+            return self.writer
+
+        # Name of the saved files. Down to the microsecond, the scans of a job queue can start within one second.
+        self.file_name = str(datetime.utcnow().strftime("%Y%m%d_%H%M%S_%f") + "_")
+        logger.info(f"{log_this.space}Output file name: {self.file_name} {param.scan_output_formats}")
+        # Positions, means, standard deviations and the number of samples (see _sample_statistics)
+        self.metadata = self._metadata()
+        self.writer = _scan_writer.create_scan_writer(self.output_path / self.file_name,
+                                                      formats=param.scan_output_formats, metadata=self.metadata)
+        return self.writer  # Opened by the "with" statement
+
+    def _open_journal(self, plan):
+        # Call after _create_writer(). Records the plan and a checkpoint whenever the writers are flushed.
+        if self._resume_state is not None:
+            self.journal = _scan_journal.ScanJournal(self._resume_state.path)
+            self.journal.record_resume(self._resume_state.completed)
+        else:
+            self.journal = _scan_journal.ScanJournal(self.output_path / f'{self.file_name}journal.jsonl')
+            self.journal.record_start(self.scan_type, plan, self.file_name,
+                                      [writer.format for writer in self.writer.writers], self.metadata)
+        self.writer.checkpoint_listeners.append(
+            lambda writer: self.journal.record_checkpoint(writer.rows_written, writer.checkpoint_state()))
+
+    def resume_from(self, state):
+        """
+        Continues the scan described by a journal instead of starting a new one.
+
+        :param state: JournalState (see _scan_journal.load_journal()).
+        """
+        self._resume_state = state
+        self.output_path = state.output_path
+
+    def create_progress_estimator(self, plan, first_point=0):
+        """
+        :param first_point: Index of the first point to measure (resumed scan).
+        :return: ProgressEstimator of the plan. The moves are estimated by the MoveTimeModel with the velocity
+            parameters of the motors, starting from their current positions.
+        """
+        motors = (self.motor_1, self.motor_2, self.motor_3)
+        return _progress.ProgressEstimator(plan, _scan_planner.MoveTimeModel(motors),
+                                           self.controller.sensor.estimated_acquisition_time(), first_point,
+                                           start=tuple(motor.current_position for motor in motors))
+
+    def _start_progress(self, progress_estimator, first_point, full_range, thread_signal_progress_status):
+        """
+        :param progress_estimator: ProgressEstimator of the scan (see create_progress_estimator()). None if there is no
+            plan to estimate, the remaining time then follows the average duration of the measured points.
+        :param first_point: Number of the points measured before (resumed scan).
+        """
+        self._scan_start_time = self.controller.clock.time()
+        self._first_point = first_point
+        self.progress_estimator = progress_estimator
+        if progress_estimator is None:
+            return
+        time_to_finish, confidence_band = progress_estimator.remaining_time(first_point)
+        (days, hours, minutes, seconds) = days_hours_minutes_seconds(timedelta(seconds=time_to_finish))
+        logger.info(f"{log_this.space}Estimated scan duration: {days} d {hours} h {minutes} m {seconds} s "
+                    f"(+- {round(confidence_band)} s)")
+        if hasattr(thread_signal_progress_status, 'emit'):
+            thread_signal_progress_status.emit([(100 / full_range) * first_point, time_to_finish, confidence_band])
+
+    def _update_progressbar(self, progress_count, full_range, thread_signal_progress_status, move_duration=None,
+                            acquisition_duration=None):
+        """
+        :param move_duration: Measured duration [s] of the move to the last point, if known.
+        :param acquisition_duration: Measured duration [s] of the acquisition of the last point, if known.
+        """
         logger.info(f"{log_this.space}Progres count: {progress_count}")
         progress = (100 / full_range) * progress_count
         logger.info(f"{log_this.space}Progress: {progress}")
 
-        stop_time = time.time()
-        dt = stop_time - start_time
         remaining_positions = full_range - progress_count
-        time_to_finish = dt * remaining_positions
-        time_to_finish = (time_to_finish / 20) + time_to_finish  # +20% na prejezdy M1 a M2
+        if self.progress_estimator is not None:
+            if move_duration is not None:
+                self.progress_estimator.record(progress_count - 1, move_duration, acquisition_duration)
+            time_to_finish, confidence_band = self.progress_estimator.remaining_time(progress_count)
+        else:
+            elapsed_time = self.controller.clock.time() - self._scan_start_time
+            time_to_finish = elapsed_time / max(progress_count - self._first_point, 1) * remaining_positions
+            confidence_band = 0.0
         logger.info(f"{log_this.space}Remaining positions = {remaining_positions}")
         delta = timedelta(seconds=time_to_finish)
         (days, hours, minutes, seconds) = days_hours_minutes_seconds(delta)
-        logger.info(f"{log_this.space}Time to finish: {days}, \"d\", {hours}, \"h\", {minutes}, \"m\", {seconds}, \"s\"")
-        progress_status = [progress, time_to_finish]
+        logger.info(f"{log_this.space}Time to finish: {days}, \"d\", {hours}, \"h\", {minutes}, \"m\", {seconds}, \"s\", "
+                    f"+- {round(confidence_band)} s")
+        progress_status = [progress, time_to_finish, confidence_band]
         if hasattr(thread_signal_progress_status, 'emit'):
             thread_signal_progress_status.emit(progress_status)
 
@@ -58,62 +167,195 @@ class Scan:
 
 
 class Scan3D(Scan):
-    def __init__(self, controller):
+    def __init__(self, controller, scan_order=param.scan_order):
         super().__init__(controller)
         self.output_path = param.output_path_3d
+        self.scan_order = scan_order  # 'raster', 'serpentine' or 'optimal'
+        self.plan = None  # ScanPlan to run instead of the one given by the motor scan positions and scan_order
 
-    def start_scanning(self, thread_signal_progress_status):
-        self.file_name = str(datetime.utcnow().strftime("%Y%m%d_%H%M%S") + "_" + ".csv")  # Name of the saved file
-        logger.info(f"{log_this.space}Output file name: {self.file_name}")
+    def set_plan(self, plan):
+        # Any ScanPlan, e.g. produced by _scan_planner.optimal_plan() for a sparse list of points. None to reset.
+        self.plan = plan
 
-        progress_count = 0
+    def build_plan(self):
+        if self.plan is not None:
+            return self.plan
+        start = (self.motor_1.current_position, self.motor_2.current_position, self.motor_3.current_position)
+        return _scan_planner.build_plan(self.motor_1, self.motor_2, self.motor_3, order=self.scan_order, start=start)
 
-        full_range = (len(self.motor_1.scan_positions) * len(self.motor_2.scan_positions) * len(
-            self.motor_3.scan_positions))
+    def _report_travel(self, plan):
+        motors = (self.motor_1, self.motor_2, self.motor_3)
+        logger.info(f"{log_this.space}Scan plan: {plan}, motor travel: {round(plan.total_travel(motors), 1)} deg")
+        if self.plan is None and self.scan_order != 'raster':
+            raster = _scan_planner.build_plan(self.motor_1, self.motor_2, self.motor_3, order='raster')
+            saved_travel, saved_fraction = _scan_planner.compare_travel(plan, raster, motors)
+            logger.info(f"{log_this.space}Travel saved compared to raster order: {round(saved_travel, 1)} deg "
+                        f"({round(saved_fraction * 100, 1)} %)")
 
-        for i in self.motor_1.scan_positions:
-            self.motor_1.move_to_position(i)
+    def _move_to_point(self, point, previous_point):
+        # Move only the motors whose position changes.
+        targets = [position if previous_position is None or position != previous_position else None
+                   for position, previous_position in zip(point, previous_point)]
+        if param.concurrent_moves:
+            self.controller.move_all(targets)
+            return
+        # Motor 1 first, then motor 2, then motor 3.
+        for motor, target in zip((self.motor_1, self.motor_2, self.motor_3), targets):
+            if target is not None:
+                motor.move_to_position(target)
 
-            for j in self.motor_2.scan_positions:
-                self.motor_2.move_to_position(j)
+    def resume_from(self, state):
+        super().resume_from(state)
+        self.set_plan(_scan_planner.ScanPlan(state.plan, name=state.plan_name))
 
-                for k in self.motor_3.scan_positions:
-                    scan_start_time = time.time()
-                    self.motor_3.move_to_position(k)
+    def start_scanning(self, thread_signal_progress_status):
+        plan = self.build_plan()
+        self._report_travel(plan)
 
-                    measurement_data = self.controller.collect_sensor_data()
+        # The points are written in the order of the plan, so the completed points are the first rows of the output.
+        progress_count = self._resume_state.completed if self._resume_state is not None else 0
+        full_range = len(plan)
+        previous_point = (None, None, None)
+        self._start_progress(self.create_progress_estimator(plan, progress_count), progress_count, full_range,
+                             thread_signal_progress_status)
 
-                    progress_count += 1
-                    self._update_progressbar(progress_count, scan_start_time, full_range, thread_signal_progress_status)
-                    self._save_to_file(measurement_data)
+        # Reduction, progress and saving of the point k run while the motors move to the point k+1.
+        with self._create_writer(), _scan_pipeline.ScanPipeline(self._process_point) as pipeline:
+            self._open_journal(plan)
+            for point in plan[progress_count:]:
+                if self.controller.motors_stopped():
+                    logger.info(f"{log_this.space}Motors are stopped. Scanning stopped.")
+                    break
+                move_start = self.controller.clock.time()
+                with self.controller.timer.measure('move'):
+                    self._move_to_point(point, previous_point)
+                previous_point = point
+                if self.controller.motors_stopped():
+                    # Stopped during the move, the point was not reached. It stays for the resumed scan.
+                    logger.info(f"{log_this.space}Motors are stopped. Scanning stopped.")
+                    break
 
-        logger.info(f"{log_this.space}Scanning done")
+                acquisition_start = self.controller.clock.time()
+                with self.controller.timer.measure('acquire'):
+                    samples = self.controller.acquire_sensor_samples()
+                acquisition_end = self.controller.clock.time()
+
+                progress_count += 1
+                pipeline.submit(samples, progress_count, full_range, thread_signal_progress_status,
+                                acquisition_start - move_start, acquisition_end - acquisition_start)
+
+        if self.writer.rows_written == full_range:
+            self.journal.record_finished(full_range)
+            logger.info(f"{log_this.space}Scanning done")
+        else:
+            logger.info(f"{log_this.space}Scan interrupted after {self.writer.rows_written} of {full_range} points. "
+                        f"Resume it with the journal {self.journal.path}")
+
+    def _process_point(self, samples, progress_count, full_range, thread_signal_progress_status, move_duration,
+                       acquisition_duration):
+        timer = self.controller.timer
+        with timer.measure('reduce'):
+            measurement_data = self.controller.reduce_sensor_data(samples)
+        with timer.measure('progress'):
+            self._update_progressbar(progress_count, full_range, thread_signal_progress_status, move_duration,
+                                     acquisition_duration)
+        with timer.measure('write'):
+            self.writer.write_row(measurement_data)
 
 
 class Scan1D(Scan3D):
     def __init__(self, controller):
-        super().__init__(controller)
+        super().__init__(controller, scan_order='raster')  # A single sweep of motor 3 has nothing to reorder
         self.output_path = param.output_path_1d
 
-    def start_scanning(self, thread_signal_progress_status):
-        self.file_name = str(datetime.utcnow().strftime("%Y%m%d_%H%M%S") + "_" + ".csv")  # Name of the saved file
-        logger.info(f"{log_this.space}Output file name: {self.file_name}")
+    def build_plan(self):
+        if self.plan is not None:
+            return self.plan
+        # Motors 1 and 2 stay at their "scan_from" position, only motor 3 sweeps.
+        return _scan_planner.ScanPlan(
+            [(self.motor_1.scan_from, self.motor_2.scan_from, k) for k in self.motor_3.scan_positions], name='1D')
 
-        progress_count = 0
 
-        full_range = (len(self.motor_3.scan_positions))
+class FlyScan1D(Scan1D):
+    """
+    On-the-fly 1D scan. Motor 3 sweeps the whole range at a constant velocity while the sensor streams continuously.
+    Every sample gets the motor 3 position interpolated from the positions polled during the sweep and the samples
+    are binned into the scan_step grid around motor_3.scan_positions. Needs the continuous acquisition of the sensor.
+    """
+
+    def _sweep_range(self, centres):
+        # Start and stop half a step beyond the outer positions plus the distance needed to reach the sweep velocity.
+        motor = self.motor_3
+        run_up = param.fly_scan_velocity ** 2 / (2 * param.fly_scan_acceleration) + motor.scan_step / 2
+        coordinates = _scan_planner.legal_arc_coordinate(motor, centres)
+        direction = 1 if coordinates[-1] >= coordinates[0] else -1
+        start, stop = np.clip((coordinates[0] - direction * run_up, coordinates[-1] + direction * run_up),
+                              0, _scan_planner.legal_arc_length(motor))
+        return (float(_scan_planner.position_from_legal_arc_coordinate(motor, start)),
+                float(_scan_planner.position_from_legal_arc_coordinate(motor, stop)),
+                direction)
+
+    def _sweep(self, acquisition, sweep_stop, direction):
+        polling_rate = self.motor_3.polling_rate
+        self.motor_3.set_polling_rate(param.fly_scan_polling_rate)  # Denser position trace
+        self.motor_3.set_velocity(velocity=param.fly_scan_velocity, acceleration=param.fly_scan_acceleration)
+        self.motor_3.set_rotation_mode(mode=2, direction=1 if direction > 0 else 2)  # Stay on the legal arc
+
+        acquisition.start_recording()
+        self.motor_3.start_position_trace()
+        try:
+            self.motor_3.move_to_position(sweep_stop)
+        finally:
+            trace = self.motor_3.stop_position_trace()
+            indices, samples = acquisition.stop_recording()
+            self.motor_3.set_polling_rate(polling_rate)
+
+        # Tag every sample with the position of motor 3 at the time it was acquired
+        trace_times, trace_positions = np.asarray(trace, dtype=float).T
+        trace_coordinates = _scan_planner.legal_arc_coordinate(self.motor_3, trace_positions)
+        sample_times = acquisition.sample_time(indices)
+        during_sweep = (sample_times >= trace_times[0]) & (sample_times <= trace_times[-1])
+        sample_coordinates = np.interp(sample_times[during_sweep], trace_times, trace_coordinates)
+        return sample_coordinates, samples[during_sweep]
+
+    def start_scanning(self, thread_signal_progress_status):
+        acquisition = self.controller.sensor.acquisition
+        if acquisition is None:
+            logger.info(f"{log_this.space}Fly scan needs the continuous acquisition. Falling back to the step scan.")
+            self.scan_type = 'Scan1D'  # So the journal of the step scan can be resumed
+            return super().start_scanning(thread_signal_progress_status)
 
-        self.motor_1.move_to_position(self.motor_1.scan_from)
-        self.motor_2.move_to_position(self.motor_2.scan_from)
+        centres = np.asarray(self.motor_3.scan_positions, dtype=float)
+        sweep_start, sweep_stop, direction = self._sweep_range(centres)
+        timer = self.controller.timer
+        with timer.measure('move'):
+            self._move_to_point((self.motor_1.scan_from, self.motor_2.scan_from, sweep_start), (None, None, None))
 
-        for k in self.motor_3.scan_positions:
-            scan_start_time = time.time()
-            self.motor_3.move_to_position(k)
+        self._start_progress(None, 0, len(centres), thread_signal_progress_status)
+        with timer.measure('sweep'):
+            sample_coordinates, samples = self._sweep(acquisition, sweep_stop, direction)
+        logger.info(f"{log_this.space}Sweep of motor 3 done: {len(samples)} samples.")
 
-            measurement_data = self.controller.collect_sensor_data()
+        # Bin the samples to the nearest scan position within half a step
+        centre_coordinates = _scan_planner.legal_arc_coordinate(self.motor_3, centres)
+        order = np.argsort(centre_coordinates)
+        midpoints = (centre_coordinates[order][1:] + centre_coordinates[order][:-1]) / 2
+        nearest = order[np.searchsorted(midpoints, sample_coordinates)]
+        within_step = np.abs(sample_coordinates - centre_coordinates[nearest]) <= self.motor_3.scan_step / 2
 
-            progress_count += 1
-            self._update_progressbar(progress_count, scan_start_time, full_range, thread_signal_progress_status)
-            self._save_to_file(measurement_data)
+        with self._create_writer() as writer:
+            for progress_count, centre in enumerate(centres, start=1):
+                bin_samples = samples[within_step & (nearest == progress_count - 1)]
+                if len(bin_samples) == 0:
+                    logger.info(f"{log_this.space}No samples around motor 3 position {centre}. Sweep too fast?")
+                    continue
+                with timer.measure('reduce'):
+                    accumulator = _sample_statistics.SampleAccumulator(len(bin_samples))
+                    accumulator.add_block((self.motor_1.current_position, self.motor_2.current_position, centre),
+                                          bin_samples)
+                    measurement_data = self.controller.reduce_sensor_data(accumulator)
+                self._update_progressbar(progress_count, len(centres), thread_signal_progress_status)
+                with timer.measure('write'):
+                    writer.write_row(measurement_data)
 
         logger.info(f"{log_this.space}Scanning done")
@@ -0,0 +1,149 @@
+import json
+
+from modules import parameters as param
+from modules import _scan_writer
+
+
+scan_types = ('3D', '1D', '1D fly', 'calibration')
+scan_orders = ('raster', 'serpentine', 'optimal')
+output_formats = ('csv', 'hdf5', 'parquet')
+config_keys = ('scan_type', 'scan_order', 'motor_1', 'motor_2', 'motor_3', 'measurement_points', 'adaptive_sampling',
+               'output_formats', 'home', 'simulated')
+
+
+def _is_number(value):
+    # JSON numbers only (true and false are ints in Python)
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _legal_position(motor_id, position):
+    # Like _Motor.check_for_illegal_position(), with the limits of parameters.py widened by the limit margin
+    left_limit, right_limit = getattr(param, f'motor_{motor_id}_limits')
+    left_limit, right_limit = left_limit - param.limit_margin, right_limit + param.limit_margin
+    if motor_id == 2:
+        return left_limit <= position <= right_limit
+    return left_limit <= position <= 360 or 0 <= position <= right_limit
+
+
+def validate_scan_config(config):
+    """
+    Scan description used by the headless runner and the job queue:
+        {
+            "scan_type": "3D",                  "3D", "1D", "1D fly" or "calibration"
+            "scan_order": "raster",             "raster", "serpentine" or "optimal"
+            "motor_1": {"from": 0, "to": 30, "step": 15},
+            "motor_2": {"from": 0, "to": 90, "step": 45},
+            "motor_3": {"from": 330, "to": 30, "step": 15},
+            "measurement_points": 500,
+            "adaptive_sampling": {"enabled": true, "target_relative_error": 0.002, "min_measurement_points": 50},
+            "output_formats": ["csv", "hdf5"],
+            "home": false,                      home the motors before the scan
+            "simulated": false                  run on the simulated hardware
+        }
+    Every key is optional. The missing ones get the defaults of parameters.py (not the settings left by the previous
+    scan), so the same description always runs the same scan.
+
+    :param config: Dictionary of the scan description.
+    :return: The dictionary with the defaults filled in.
+    :raise ValueError: If the scan description is not valid.
+    """
+    if not isinstance(config, dict):
+        raise ValueError('The scan description has to be a JSON object.')
+    unknown_keys = set(config) - set(config_keys)
+    if unknown_keys:
+        raise ValueError(f'Unknown keys: {", ".join(sorted(unknown_keys))}')
+
+    config.setdefault('scan_type', '3D')
+    config.setdefault('scan_order', param.scan_order)
+    config.setdefault('output_formats', list(param.scan_output_formats))
+    config.setdefault('home', False)
+    config.setdefault('simulated', param.simulate_hardware)
+    if config['scan_type'] not in scan_types:
+        raise ValueError(f'Unknown scan type "{config["scan_type"]}". Use one of {", ".join(scan_types)}.')
+    if config['scan_order'] not in scan_orders:
+        raise ValueError(f'Unknown scan order "{config["scan_order"]}". Use one of {", ".join(scan_orders)}.')
+    for key in ('home', 'simulated'):
+        if not isinstance(config[key], bool):
+            raise ValueError(f'{key} has to be true or false.')
+    if not isinstance(config['output_formats'], list) or not config['output_formats'] or \
+            set(map(str, config['output_formats'])) - set(output_formats):
+        raise ValueError(f'output_formats has to be a list of some of {", ".join(output_formats)}.')
+    _scan_writer.check_output_formats(config['output_formats'])  # The packages of hdf5 and parquet are optional
+    for motor_id in (1, 2, 3):
+        motor_range = config.get(f'motor_{motor_id}', {})
+        if not isinstance(motor_range, dict) or set(motor_range) - {'from', 'to', 'step'}:
+            raise ValueError(f'motor_{motor_id} has to be an object with some of "from", "to" and "step".')
+        for key, value in motor_range.items():
+            if not _is_number(value):
+                raise ValueError(f'"{key}" of motor_{motor_id} has to be a number.')
+        if motor_range.get('step', 1) <= 0:
+            raise ValueError(f'The step of motor_{motor_id} has to be positive.')
+        config[f'motor_{motor_id}'] = dict(zip(('from', 'to', 'step'), param.scan_range), **motor_range)
+        for key in ('from', 'to'):
+            if not _legal_position(motor_id, config[f'motor_{motor_id}'][key]):
+                raise ValueError(f'"{key}" of motor_{motor_id} ({config[f"motor_{motor_id}"][key]}) is outside of the '
+                                 f'legal space of the motor.')
+    config.setdefault('measurement_points', param.measurement_points)
+    measurement_points = config['measurement_points']
+    if not _is_number(measurement_points) or not isinstance(measurement_points, int) or measurement_points <= 0:
+        raise ValueError('measurement_points has to be a positive integer.')
+    enabled = 'adaptive_sampling' in config or param.adaptive_sampling  # Given without "enabled" turns it on
+    if isinstance(config.get('adaptive_sampling'), bool):
+        config['adaptive_sampling'] = {'enabled': config['adaptive_sampling']}
+    adaptive_sampling = config.get('adaptive_sampling', {})
+    if not isinstance(adaptive_sampling, dict) or \
+            set(adaptive_sampling) - {'enabled', 'target_relative_error', 'min_measurement_points'}:
+        raise ValueError('adaptive_sampling has to be true, false or an object with some of "enabled", '
+                         '"target_relative_error" and "min_measurement_points".')
+    if not isinstance(adaptive_sampling.get('enabled', True), bool):
+        raise ValueError('"enabled" of adaptive_sampling has to be true or false.')
+    if not _is_number(adaptive_sampling.get('target_relative_error', 1)) or \
+            adaptive_sampling.get('target_relative_error', 1) <= 0:
+        raise ValueError('"target_relative_error" of adaptive_sampling has to be a positive number.')
+    min_measurement_points = adaptive_sampling.get('min_measurement_points', 1)
+    if not _is_number(min_measurement_points) or not isinstance(min_measurement_points, int) or \
+            min_measurement_points <= 0:
+        raise ValueError('"min_measurement_points" of adaptive_sampling has to be a positive integer.')
+    config['adaptive_sampling'] = {
+        'enabled': adaptive_sampling.get('enabled', enabled),
+        'target_relative_error': adaptive_sampling.get('target_relative_error', param.adaptive_target_relative_error),
+        'min_measurement_points': adaptive_sampling.get('min_measurement_points', param.adaptive_min_samples)}
+    return config
+
+
+def load_scan_config(path):
+    """
+    :param path: JSON scan file (see validate_scan_config()).
+    :return: Dictionary of the scan file with the defaults filled in.
+    :raise ValueError: If the scan file is not valid.
+    """
+    with open(path, encoding='utf-8') as file:
+        return validate_scan_config(json.load(file))
+
+
+def apply_scan_config(controller, config):
+    """
+    Sets the scan parameters of the controller like the GUI does. Every parameter is set, the description has the
+    defaults filled in (see validate_scan_config()).
+
+    :return: None
+    """
+    param.scan_output_formats = tuple(config['output_formats'])
+    for motor_id in (1, 2, 3):
+        motor_range = config[f'motor_{motor_id}']
+        controller.motors[motor_id].set_measurement_parameters(
+            scan_from=motor_range['from'], scan_to=motor_range['to'], scan_step=motor_range['step'])
+    controller.sensor.set_number_of_measurement_points(config['measurement_points'])
+    adaptive_sampling = config['adaptive_sampling']
+    controller.sensor.set_adaptive_sampling(adaptive_sampling['enabled'], adaptive_sampling['target_relative_error'],
+                                            adaptive_sampling['min_measurement_points'])
+    controller.set_scan_order(config['scan_order'])
+    if config['scan_type'] != 'calibration':
+        controller.set_scan_type(config['scan_type'])
+
+
+def start_position(config):
+    """
+    :return: Positions of the motors 1, 2, 3 where the scan described by the config starts ("from" of every motor).
+    """
+    return tuple(float(config[f'motor_{motor_id}']['from']) for motor_id in (1, 2, 3))
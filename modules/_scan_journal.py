@@ -0,0 +1,103 @@
+import os
+import json
+import logging
+from pathlib import Path
+from datetime import datetime
+
+from modules.app_logger import log_this
+
+
+logger = logging.getLogger(__name__)
+
+
+class ScanJournal:
+    """
+    JSON lines file next to the scan output recording the scan plan and its progress:
+        start       plan, output file name and formats, metadata
+        checkpoint  number of completed points and the state of every output file after each writer checkpoint
+        resume      the scan continued after an interruption
+        finished    all the points were measured
+    Every record is synced to the disk, so after a stop, a USB failure or a crash the scan can continue from the last
+    checkpoint (see MotorController.resume()).
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def __repr__(self):
+        return f'Scan journal {self.path}'
+
+    def _record(self, event, mode='a', **fields):
+        record = {'event': event, 'time_utc': datetime.utcnow().isoformat(), **fields}
+        with open(self.path, mode, encoding='utf-8') as file:
+            file.write(json.dumps(record, default=str) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+    def record_start(self, scan_type, plan, file_name, formats, metadata):
+        # A new journal, never appended to the journal of another scan
+        self._record('start', 'x', scan_type=scan_type, plan_name=plan.name, plan=plan.points, file_name=file_name,
+                     formats=list(formats), metadata=metadata)
+        logger.info(f'{log_this.space}Scan journal: {self.path}')
+
+    def record_checkpoint(self, completed, outputs):
+        self._record('checkpoint', completed=completed, outputs=outputs)
+
+    def record_resume(self, completed):
+        self._record('resume', completed=completed)
+        logger.info(f'{log_this.space}Resuming the scan of {self.path} after {completed} points.')
+
+    def record_finished(self, completed):
+        self._record('finished', completed=completed)
+
+
+class JournalState:
+    """
+    Scan described by a journal: the plan, the output files and how far the scan got.
+    """
+
+    def __init__(self, path, start_record):
+        self.path = Path(path)
+        self.scan_type = start_record['scan_type']
+        self.plan_name = start_record['plan_name']
+        self.plan = [tuple(point) for point in start_record['plan']]
+        self.file_name = start_record['file_name']
+        self.formats = tuple(start_record['formats'])
+        self.metadata = start_record['metadata']
+        self.completed = 0  # Points safely written into every output file
+        self.outputs = None  # Checkpoint state of the output files (see ScanWriter.checkpoint_state())
+        self.finished = False
+
+    def __repr__(self):
+        return f'{self.scan_type} {self.file_name}: {self.completed}/{len(self.plan)} points'
+
+    @property
+    def output_path(self):
+        return self.path.parent
+
+
+def load_journal(path):
+    """
+    :param path: Path to the journal file.
+    :return: JournalState after the last complete record.
+    """
+    state = None
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.info(f'{log_this.space}Skipping incomplete journal record: {line.strip()}')
+                continue  # The last line of a crashed scan may be cut off
+            if record['event'] == 'start':
+                state = JournalState(path, record)
+            elif state is None:
+                raise ValueError(f'Scan journal {path} does not start with the scan plan.')
+            elif record['event'] == 'checkpoint':
+                state.completed = record['completed']
+                state.outputs = record['outputs']
+            elif record['event'] == 'finished':
+                state.finished = True
+    if state is None:
+        raise ValueError(f'Scan journal {path} is empty.')
+    return state
@@ -0,0 +1,77 @@
+import queue
+import logging
+import threading
+
+from modules import parameters as param
+from modules.app_logger import log_this
+
+
+logger = logging.getLogger(__name__)
+
+
+_end_of_scan = object()  # Queue item closing the pipeline
+
+
+class ScanPipeline:
+    """
+    Processes the measured scan points in a background thread while the motors travel to the next point.
+    The "process" function (reduction, logging, progress signalling, saving) is called for every submitted point
+    in the order the points were submitted. The queue is bounded, so the acquisition waits if the processing
+    falls behind instead of piling up the samples in memory.
+
+    Use it as a context manager. Leaving the "with" block (scan finished, stopped or failed) processes and flushes
+    everything that has been submitted so far.
+    """
+
+    def __init__(self, process, max_queue_size=param.pipeline_queue_size):
+        self._process = process
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._error = None
+        self.processed = 0
+        self._thread = threading.Thread(target=self._run, name='scan-pipeline', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+        # The scan failed. Flush the finished points anyway, but let the original exception propagate.
+        try:
+            self.close()
+        except Exception as e:
+            if e is not exc_value:
+                logger.exception(f'{log_this.space}Processing of the scan points failed as well: {e}')
+
+    def submit(self, *args):
+        # Blocks when the queue is full
+        if self._error is not None:
+            raise self._error
+        self._queue.put(args)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _end_of_scan:
+                return
+            if self._error is not None:
+                continue  # Keep draining, so submit() never blocks forever
+            try:
+                self._process(*item)
+                self.processed += 1
+            except Exception as e:
+                self._error = e
+
+    def close(self):
+        """
+        Waits until every submitted point is processed.
+
+        :return: None. Raises the first exception of the processing function.
+        """
+        if self._thread.is_alive():
+            self._queue.put(_end_of_scan)
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,272 @@
+import logging
+
+import numpy as np
+
+from modules import _kinematics
+from modules import parameters as param
+from modules.app_logger import log_this
+
+
+logger = logging.getLogger(__name__)
+
+
+scan_orders = ('raster', 'serpentine', 'optimal')
+
+
+def legal_arc_coordinate(motor, position):
+    """
+    Unwraps the position into a continuous coordinate growing along the legal range of the motor.
+    Motors 1 and 3 rotate over 0/360 (legal from hardware_limits[0] through 360/0 to hardware_limits[1]), so the
+    coordinate starts at the left limit. Motor 2 moves on a plain interval and keeps its position.
+    Accepts numpy arrays.
+    """
+    if motor.motor_id == 2:
+        return position
+    return (np.asarray(position) - motor.hardware_limits[0]) % 360
+
+
+def position_from_legal_arc_coordinate(motor, coordinate):
+    if motor.motor_id == 2:
+        return coordinate
+    return (np.asarray(coordinate) + motor.hardware_limits[0]) % 360
+
+
+def legal_arc_length(motor):
+    return legal_arc_coordinate(motor, motor.hardware_limits[1]) - legal_arc_coordinate(motor, motor.hardware_limits[0])
+
+
+def axis_distance(motor, start, stop):
+    # Angle [deg] the motor travels between two positions without passing through its illegal zone.
+    return float(abs(legal_arc_coordinate(motor, stop) - legal_arc_coordinate(motor, start)))
+
+
+class ScanPlan:
+    """
+    Ordered list of scan points. Every point is a (motor_1, motor_2, motor_3) position tuple in [deg].
+    """
+
+    def __init__(self, points, name='custom'):
+        self.points = [tuple(float(position) for position in point) for point in points]
+        self.name = name
+
+    def __repr__(self):
+        return f'{self.name} scan plan ({len(self.points)} points)'
+
+    def __len__(self):
+        return len(self.points)
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def __getitem__(self, index):
+        return self.points[index]
+
+    def axis_travel(self, motors):
+        """
+        :param motors: Motors 1, 2, 3.
+        :return: Travel [deg] of every motor when visiting the points in order.
+        """
+        travel = [0.0, 0.0, 0.0]
+        for previous_point, point in zip(self.points, self.points[1:]):
+            for axis, motor in enumerate(motors):
+                travel[axis] += axis_distance(motor, previous_point[axis], point[axis])
+        return tuple(travel)
+
+    def total_travel(self, motors):
+        return sum(self.axis_travel(motors))
+
+    def estimated_duration(self, model, start=None):
+        """
+        :param model: MoveTimeModel of the motors.
+        :param start: Motor positions before the first point. If None, the first move is not counted.
+        :return: Estimated time [s] spent moving and settling when visiting the points in order.
+        """
+        points = self.points if start is None else [tuple(start)] + self.points
+        return sum(model.step_time(previous_point, point) for previous_point, point in zip(points, points[1:]))
+
+
+class MoveTimeModel:
+    """
+    Estimates how long a move between two scan points takes.
+    Every axis follows a trapezoidal velocity profile (or a triangular one for short moves) with the velocity and
+    acceleration of the motor, and every move ends with the settle time of the motor (the fixed settle time, or the
+    average of the adaptive settle times so far, see _settle.SettleDetector).
+    Concurrent moves (MotorController.move_all) take as long as the slowest axis, sequential moves add up.
+    """
+
+    def __init__(self, motors, settle_time=None, concurrent=param.concurrent_moves):
+        """
+        :param settle_time: [s] Settle time of every move. The expected settle time of every motor if None.
+        """
+        self.motors = motors
+        self.concurrent = concurrent
+        self.velocities = []
+        self.accelerations = []
+        self.settle_times = []
+        for motor in motors:
+            velocity, acceleration = motor.get_velocity()
+            self.velocities.append(float(velocity))
+            self.accelerations.append(float(acceleration))
+            self.settle_times.append(
+                float(motor.settle_detector.expected_settle_time()) if settle_time is None else settle_time)
+
+    def axis_time(self, axis, distance):
+        """
+        :param axis: Index of the motor in "motors".
+        :param distance: Distance [deg] to travel. Accepts numpy arrays.
+        :return: Time [s] of the move including the settle time. Zero if the motor does not move.
+        """
+        move_time = _kinematics.trapezoidal_move_time(distance, self.velocities[axis], self.accelerations[axis])
+        return np.where(np.asarray(distance) > 0, move_time + self.settle_times[axis], 0.0)
+
+    def step_time(self, point, next_point):
+        axis_times = [float(self.axis_time(axis, axis_distance(motor, point[axis], next_point[axis])))
+                      for axis, motor in enumerate(self.motors)]
+        return max(axis_times) if self.concurrent else sum(axis_times)
+
+    def cost_matrix(self, points, start=None):
+        """
+        :return: Matrix of the step times between all the points (and from the "start" position in the last row).
+        """
+        points = np.asarray(points, dtype=float)
+        if start is not None:
+            points = np.vstack((points, start))
+        cost = np.zeros((len(points), len(points)))
+        for axis, motor in enumerate(self.motors):
+            unwrapped = legal_arc_coordinate(motor, points[:, axis])
+            distance = np.abs(unwrapped[:, None] - unwrapped[None, :])
+            axis_cost = self.axis_time(axis, distance)
+            cost = np.maximum(cost, axis_cost) if self.concurrent else cost + axis_cost
+        return cost
+
+
+def raster_plan(motor_1_positions, motor_2_positions, motor_3_positions):
+    # Motor 3 always sweeps from its first position to the last one.
+    points = [(i, j, k) for i in motor_1_positions for j in motor_2_positions for k in motor_3_positions]
+    return ScanPlan(points, name='raster')
+
+
+def serpentine_plan(motor_1_positions, motor_2_positions, motor_3_positions):
+    # Boustrophedon: motor 3 reverses its direction after every motor 2 step and motor 2 after every motor 1 step,
+    # so no pass starts with a return move across the whole range.
+    points = []
+    reverse_2 = False
+    reverse_3 = False
+    for i in motor_1_positions:
+        for j in (motor_2_positions[::-1] if reverse_2 else motor_2_positions):
+            for k in (motor_3_positions[::-1] if reverse_3 else motor_3_positions):
+                points.append((i, j, k))
+            reverse_3 = not reverse_3
+        reverse_2 = not reverse_2
+    return ScanPlan(points, name='serpentine')
+
+
+def legal_points(points, motors):
+    # Drop the points which any of the motors can't reach.
+    legal = []
+    for point in points:
+        if any(motor.check_for_illegal_position(position) for motor, position in zip(motors, point)):
+            logger.info(f'{log_this.space}Scan point {point} is outside of the legal space. Skipping.')
+        else:
+            legal.append(point)
+    return legal
+
+
+def _nearest_neighbour_order(cost, first):
+    n = len(cost)
+    order = [first]
+    visited = np.zeros(n, dtype=bool)
+    visited[first] = True
+    for _ in range(n - 1):
+        step_costs = np.where(visited, np.inf, cost[order[-1]])
+        following = int(np.argmin(step_costs))
+        order.append(following)
+        visited[following] = True
+    return order
+
+
+def _two_opt(order, cost, start_cost=None, max_passes=param.planner_max_passes):
+    """
+    Improves an open path by reversing its segments while it gets cheaper.
+
+    :param order: Indices of the points in the visiting order.
+    :param cost: Matrix of the step times between the points.
+    :param start_cost: Step times from the start position to every point. If None, the first point is free to change
+        only by the reversal of a segment starting at it.
+    """
+    path = np.array(order)
+    n = len(path)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(n - 1):
+            # Reverse path[i:j + 1] for every j > i at once. Cost of the edge entering position i:
+            if i == 0:
+                entering_old = start_cost[path[0]] if start_cost is not None else 0.0
+                entering_new = start_cost[path[i + 1:]] if start_cost is not None else np.zeros(n - i - 1)
+            else:
+                entering_old = cost[path[i - 1], path[i]]
+                entering_new = cost[path[i - 1], path[i + 1:]]
+            j = np.arange(i + 1, n)
+            leaving_old = np.where(j < n - 1, cost[path[j], path[np.minimum(j + 1, n - 1)]], 0.0)
+            leaving_new = np.where(j < n - 1, cost[path[i], path[np.minimum(j + 1, n - 1)]], 0.0)
+            delta = entering_new + leaving_new - entering_old - leaving_old
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-9:
+                path[i:j[best] + 1] = path[i:j[best] + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return path.tolist()
+
+
+def optimal_plan(points, motors, start=None, candidates=()):
+    """
+    Orders the scan points to minimise the estimated time spent moving.
+
+    :param points: Any iterable of (motor_1, motor_2, motor_3) positions, e.g. a sparse list of triplets.
+    :param motors: Motors 1, 2, 3 (used for the limits and the velocity parameters).
+    :param start: Current motor positions. The plan starts close to it when given.
+    :param candidates: Already ordered ScanPlans (e.g. raster, serpentine). The best one is returned if none of the
+        heuristics beat it.
+    :return: ScanPlan
+    """
+    points = legal_points([tuple(float(position) for position in point) for point in points], motors)
+    model = MoveTimeModel(motors)
+    plans = [plan for plan in candidates]
+
+    if 1 < len(points) <= param.planner_max_points:
+        cost = model.cost_matrix(points, start)
+        start_cost = cost[-1, :-1] if start is not None else None
+        cost = cost[:-1, :-1] if start is not None else cost
+        first = int(np.argmin(start_cost)) if start is not None else 0
+        order = _two_opt(_nearest_neighbour_order(cost, first), cost, start_cost)
+        plans.append(ScanPlan([points[index] for index in order], name='optimal'))
+    elif not plans:
+        plans.append(ScanPlan(points, name='optimal'))
+
+    best_plan = min(plans, key=lambda plan: plan.estimated_duration(model, start))
+    logger.info(f'{log_this.space}Estimated move time of the {best_plan.name} plan: '
+                f'{round(best_plan.estimated_duration(model, start), 1)} s')
+    return best_plan
+
+
+def build_plan(motor_1, motor_2, motor_3, order='raster', start=None):
+    positions = (motor_1.scan_positions, motor_2.scan_positions, motor_3.scan_positions)
+    if order == 'raster':
+        return raster_plan(*positions)
+    elif order == 'serpentine':
+        return serpentine_plan(*positions)
+    elif order == 'optimal':
+        candidates = (raster_plan(*positions), serpentine_plan(*positions))
+        return optimal_plan(candidates[0].points, (motor_1, motor_2, motor_3), start=start, candidates=candidates)
+    raise ValueError(f'Unknown scan order "{order}". Use one of: {", ".join(scan_orders)}.')
+
+
+def compare_travel(plan, reference_plan, motors):
+    """
+    :return: Travel [deg] saved by "plan" compared to "reference_plan" and the saved fraction of the reference travel.
+    """
+    reference_travel = reference_plan.total_travel(motors)
+    saved_travel = reference_travel - plan.total_travel(motors)
+    saved_fraction = saved_travel / reference_travel if reference_travel else 0.0
+    return saved_travel, saved_fraction
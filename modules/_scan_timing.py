@@ -0,0 +1,65 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from modules.app_logger import log_this
+
+
+logger = logging.getLogger(__name__)
+
+
+class PhaseTimer:
+    """
+    Accumulates the time spent in the phases of a scan (move, settle, acquire, reduce, write...).
+    Every phase is timed by the controller clock (simulated time when running on the simulated hardware) and by the
+    real time (the CPU cost, which is what matters in an accelerated simulation).
+    Thread safe. The processing pipeline and the concurrent moves overlap with the other phases, so the totals are
+    busy times of every phase, not shares of the scan duration.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._phases = {}  # phase: [count, clock total, real total]
+
+    def __repr__(self):
+        return 'Phase timer: ' + ', '.join(f'{phase} {round(clock_total, 3)} s ({count}x)'
+                                           for phase, (count, clock_total, _) in self._phases.items())
+
+    @contextmanager
+    def measure(self, phase):
+        clock_start = self.clock.time()
+        real_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, self.clock.time() - clock_start, time.perf_counter() - real_start)
+
+    def add(self, phase, clock_duration, real_duration):
+        with self._lock:
+            totals = self._phases.setdefault(phase, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += clock_duration
+            totals[2] += real_duration
+
+    def reset(self):
+        with self._lock:
+            self._phases = {}
+
+    def report(self):
+        """
+        :return: {phase: {"count", "clock_total", "clock_mean", "real_total", "real_mean"}} with the times in [s].
+        """
+        with self._lock:
+            return {phase: {'count': count,
+                            'clock_total': clock_total,
+                            'clock_mean': clock_total / count,
+                            'real_total': real_total,
+                            'real_mean': real_total / count}
+                    for phase, (count, clock_total, real_total) in self._phases.items()}
+
+    def log_report(self):
+        for phase, times in self.report().items():
+            logger.info(f'{log_this.space}{phase}: {times["count"]}x, {round(times["clock_total"], 3)} s '
+                        f'(real {round(times["real_total"], 3)} s)')
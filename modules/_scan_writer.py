@@ -0,0 +1,374 @@
+import os
+import json
+import time
+import logging
+import importlib
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+
+from modules import parameters as param
+from modules import _sample_statistics
+from modules.app_logger import log_this
+
+
+logger = logging.getLogger(__name__)
+
+
+def _import_optional(module_name, output_format):
+    # The packages of the optional output formats are imported by their writers (they take long to import)
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        raise ImportError(f'The "{output_format}" scan output format needs the {module_name.split(".")[0]} '
+                          f'package.') from None
+
+
+class ScanWriter:
+    """
+    Base class of the scan output backends. The output stays open for the whole scan.
+    Rows are collected and written in batches. Every batch ends with a checkpoint, so a crash loses at most the rows
+    of one batch. Subclasses implement _open(), _write_batch(), _checkpoint() and _close().
+    checkpoint_state() describes the file after the last checkpoint. restore() (called before open()) cuts the file
+    back to such a state, so an interrupted scan can continue appending to it (see _scan_journal). Otherwise the file is
+    created and must not exist yet, so two scans never write into one file.
+    """
+    format = ''
+    suffix = ''
+    requires = ()  # Optional packages needed by the format
+
+    def __init__(self, path, columns=_sample_statistics.summary_columns, metadata=None,
+                 flush_rows=param.writer_flush_rows, flush_interval=param.writer_flush_interval):
+        """
+        :param path: Output path without the suffix of the format.
+        :param columns: Names of the values of every row.
+        :param metadata: Dictionary describing the scan (motor ranges, steps, velocities, number of samples...).
+        """
+        self.path = Path(f'{path}{self.suffix}')
+        self.columns = list(columns)
+        self.metadata = metadata or {}
+        self.flush_rows = flush_rows  # Checkpoint after this many rows...
+        self.flush_interval = flush_interval  # ...or when the oldest buffered row is older than this [s]
+        self.rows_written = 0
+        self.resumed = False  # Appends to the file of an interrupted scan (see restore())
+        self._pending = []
+        self._last_flush = time.monotonic()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} {self.path}'
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        self._open()
+        self._last_flush = time.monotonic()
+        logger.info(f'{log_this.space}Writing scan data into {self.path}')
+
+    def write_row(self, row):
+        """
+        :param row: Values in the order of "columns" (e.g. the summary of SampleAccumulator).
+        :return: None.
+        """
+        self.buffer_row(row)
+        if self.flush_due():
+            self.flush()
+
+    def buffer_row(self, row):
+        if not self._pending:
+            self._last_flush = time.monotonic()  # The batch starts with its first row
+        self._pending.append(tuple(float(value) for value in row))
+
+    def flush_due(self):
+        return len(self._pending) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval
+
+    def flush(self):
+        if self._pending:
+            self._write_batch(self._pending)
+            self.rows_written += len(self._pending)
+            self._pending = []
+        self._checkpoint()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self.is_open:
+            try:
+                self.flush()
+            finally:
+                self._close()  # Even if the last batch fails, so the file gets its footer and is released
+            logger.info(f'{log_this.space}{self.rows_written} rows written into {self.path}')
+
+    def checkpoint_state(self):
+        return {'rows': self.rows_written}
+
+    def restore(self, state):
+        self.rows_written = state['rows']
+        self.resumed = True
+
+    @property
+    def is_open(self):
+        raise NotImplementedError
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _write_batch(self, rows):
+        raise NotImplementedError
+
+    def _checkpoint(self):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+
+class CsvScanWriter(ScanWriter):
+    """
+    Semicolon separated text file with a header row. Checkpoints are flush + os.fsync.
+    """
+    format = 'csv'
+    suffix = '.csv'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._file = None
+
+    @property
+    def is_open(self):
+        return self._file is not None
+
+    def _open(self):
+        self._file = open(self.path, 'a' if self.resumed else 'x', encoding='utf-8')
+        if self._file.tell() == 0:
+            self._file.write(';'.join(self.columns) + '\n')
+            self._checkpoint()
+
+    def checkpoint_state(self):
+        return {'rows': self.rows_written, 'offset': self._file.tell()}
+
+    def restore(self, state):
+        # Drop the rows written after the checkpoint (e.g. written, but not journaled before a crash)
+        super().restore(state)
+        if self.path.exists():
+            os.truncate(self.path, state.get('offset', 0))  # No offset: nothing was checkpointed, start over
+
+    def _write_batch(self, rows):
+        self._file.write(''.join(';'.join(str(value) for value in row) + '\n' for row in rows))
+
+    def _checkpoint(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _close(self):
+        self._file.close()
+        self._file = None
+
+
+class Hdf5ScanWriter(ScanWriter):
+    """
+    HDF5 file with one chunked, resizable float64 dataset per column, so tools can read single columns (or memory-map
+    them) without parsing text. The scan metadata is stored in the attributes of the file.
+    """
+    format = 'hdf5'
+    suffix = '.h5'
+    requires = ('h5py',)
+
+    def __init__(self, *args, **kwargs):
+        self._h5py = _import_optional('h5py', self.format)
+        super().__init__(*args, **kwargs)
+        self._file = None
+
+    @property
+    def is_open(self):
+        return self._file is not None
+
+    def _open(self):
+        self._file = self._h5py.File(self.path, 'a' if self.resumed else 'x')
+        for column in self.columns:
+            if column not in self._file:
+                self._file.create_dataset(column, shape=(0,), maxshape=(None,), dtype='f8',
+                                          chunks=(max(self.flush_rows, 1),))
+        for key, value in self.metadata.items():
+            self._file.attrs[key] = value if not isinstance(value, (dict, type(None))) else json.dumps(value)
+
+    def restore(self, state):
+        super().restore(state)
+        with self._h5py.File(self.path, 'a') as file:
+            for column in self.columns:
+                if column in file:
+                    file[column].resize((state['rows'],))
+
+    def _write_batch(self, rows):
+        values = np.asarray(rows, dtype=float)
+        for index, column in enumerate(self.columns):
+            dataset = self._file[column]
+            start = dataset.shape[0]
+            dataset.resize((start + len(values),))
+            dataset[start:] = values[:, index]
+
+    def _checkpoint(self):
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+        self._file = None
+
+
+class ParquetScanWriter(ScanWriter):
+    """
+    Parquet file with float64 columns. Every batch is one row group. The scan metadata is stored as JSON in the
+    "scan_metadata" key of the schema metadata.
+    Parquet writes its footer when the file is closed, so unlike CSV and HDF5 the file is readable only after the scan.
+    A Parquet file can't be appended to, so a resumed scan continues in a new part file (<name>_part2.parquet, ...).
+    """
+    format = 'parquet'
+    suffix = '.parquet'
+    requires = ('pyarrow',)
+
+    def __init__(self, *args, **kwargs):
+        self._pa = _import_optional('pyarrow', self.format)
+        self._pq = _import_optional('pyarrow.parquet', self.format)
+        super().__init__(*args, **kwargs)
+        self._writer = None
+        self._schema = None
+        self._base_path = self.path.with_suffix('')
+        self.part = 1
+
+    @property
+    def is_open(self):
+        return self._writer is not None
+
+    def _open(self):
+        if self.path.exists():  # A resumed scan writes a new part file too
+            raise FileExistsError(f'{self.path} exists already.')
+        pa = self._pa
+        self._schema = pa.schema([(column, pa.float64()) for column in self.columns],
+                                 metadata={'scan_metadata': json.dumps(self.metadata, default=str)})
+        self._writer = self._pq.ParquetWriter(self.path, self._schema)
+
+    def _write_batch(self, rows):
+        values = np.asarray(rows, dtype=float)
+        pa = self._pa
+        table = pa.Table.from_arrays([pa.array(values[:, index]) for index in range(len(self.columns))],
+                                     schema=self._schema)
+        self._writer.write_table(table)
+
+    def checkpoint_state(self):
+        return {'rows': self.rows_written, 'part': self.part}
+
+    def restore(self, state):
+        super().restore(state)
+        self.part = state.get('part', 0) + 1
+        if self.part > 1:
+            self.path = Path(f'{self._base_path}_part{self.part}{self.suffix}')
+
+    def _checkpoint(self):
+        pass  # Row groups are written by write_table()
+
+    def _close(self):
+        self._writer.close()
+        self._writer = None
+
+
+scan_writers = {writer.format: writer for writer in (CsvScanWriter, Hdf5ScanWriter, ParquetScanWriter)}
+
+
+class ScanWriterGroup:
+    """
+    Writes the same rows into several output formats at once. All the writers are flushed together, so they hold
+    the same rows after every checkpoint. Checkpoint listeners are called with the group after every flush.
+    """
+
+    def __init__(self, writers):
+        self.writers = list(writers)
+        self.checkpoint_listeners = []
+
+    def __repr__(self):
+        return f'Scan writers: {", ".join(str(writer.path) for writer in self.writers)}'
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        for writer in self.writers:
+            writer.open()
+
+    @property
+    def rows_written(self):
+        return min(writer.rows_written for writer in self.writers)
+
+    def write_row(self, row):
+        for writer in self.writers:
+            writer.buffer_row(row)
+        if any(writer.flush_due() for writer in self.writers):
+            self.flush()
+
+    def flush(self):
+        for writer in self.writers:
+            writer.flush()
+        for listener in self.checkpoint_listeners:
+            listener(self)
+
+    def checkpoint_state(self):
+        return {writer.format: writer.checkpoint_state() for writer in self.writers}
+
+    def restore(self, states):
+        for writer in self.writers:
+            writer.restore(states[writer.format])
+
+    def close(self):
+        # Every writer gets closed even if another one fails. The first error is raised afterwards.
+        errors = []
+        if any(writer.is_open for writer in self.writers):
+            try:
+                self.flush()
+            except Exception as e:
+                errors.append(e)
+        for writer in self.writers:
+            try:
+                writer.close()
+            except Exception as e:
+                errors.append(e)
+        for error in errors[1:]:
+            logger.info(f'{log_this.space}Closing the scan writers failed also with: {error!r}')
+        if errors:
+            raise errors[0]
+
+
+def check_output_formats(formats):
+    """
+    Checks the output formats before a scan, so a missing optional package does not show up only when the writers are
+    created. The packages are looked up, not imported.
+
+    :param formats: Any of 'csv', 'hdf5', 'parquet'.
+    :raise ValueError: If a format is unknown or its package is not installed.
+    """
+    unknown_formats = [output_format for output_format in formats if output_format not in scan_writers]
+    if unknown_formats:
+        raise ValueError(f'Unknown scan output format {unknown_formats}. Use any of: {", ".join(scan_writers)}.')
+    for output_format in formats:
+        for package in scan_writers[output_format].requires:
+            if importlib.util.find_spec(package) is None:
+                raise ValueError(f'The "{output_format}" scan output format needs the {package} package '
+                                 f'(pip install {package}).')
+
+
+def create_scan_writer(path, formats=param.scan_output_formats, columns=_sample_statistics.summary_columns,
+                       metadata=None):
+    """
+    :param path: Output path without the suffix.
+    :param formats: Any of 'csv', 'hdf5', 'parquet'.
+    :return: ScanWriterGroup writing into every requested format.
+    """
+    check_output_formats(formats)
+    return ScanWriterGroup(scan_writers[output_format](path, columns=columns, metadata=metadata)
+                           for output_format in formats)
@@ -0,0 +1,114 @@
+import logging
+
+import numpy as np
+
+from modules import parameters as param
+from modules.app_logger import log_this
+
+
+logger = logging.getLogger(__name__)
+
+
+def _angle_difference(angle, reference):
+    # Shortest difference [deg] of two angles (359.99 and 0.01 are 0.02 apart)
+    return abs((angle - reference + 180) % 360 - 180)
+
+
+class SettleDetector:
+    """
+    Decides when a motor is settled after a move.
+        fixed     ... waits the fixed settle time (param.motor_settle_time)
+        adaptive  ... polls the position (and the sensor, if given) and declares the motor settled as soon as the
+                      readings stay within their tolerances for the whole window. Gives up after the timeout.
+    The settle time of every call is recorded for tuning the tolerances and the window (see report()).
+    """
+
+    def __init__(self, clock, mode=param.settle_mode, fixed_time=param.motor_settle_time,
+                 position_tolerance=param.settle_position_tolerance, sensor_tolerance=param.settle_sensor_tolerance,
+                 window=param.settle_window, timeout=param.settle_timeout, poll_interval=param.settle_poll_interval):
+        """
+        :param clock: Clock of the motor controller.
+        :param position_tolerance: [deg] Allowed change of the position within the window.
+        :param sensor_tolerance: Allowed relative change of the sensor reading within the window.
+        :param window: [s] How long the readings have to stay within the tolerances.
+        :param timeout: [s] The longest wait. The motor counts as settled afterwards anyway.
+        :param poll_interval: [s] Time between the readings.
+        """
+        if mode not in ('fixed', 'adaptive'):
+            raise ValueError(f'Unknown settle mode "{mode}". Use "fixed" or "adaptive".')
+        self.clock = clock
+        self.mode = mode
+        self.fixed_time = fixed_time
+        self.position_tolerance = position_tolerance
+        self.sensor_tolerance = sensor_tolerance
+        self.window = window
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.settle_times = []  # [s] Duration of every wait
+        self.timeouts = 0  # Waits which ended by the timeout
+
+    def __repr__(self):
+        return f'Settle detector ({self.mode})'
+
+    def reset(self):
+        self.settle_times = []
+        self.timeouts = 0
+
+    def expected_settle_time(self):
+        # [s] Settle time to plan with: the fixed time, or the average of the adaptive waits so far
+        if self.mode == 'fixed':
+            return self.fixed_time
+        if self.settle_times:
+            return float(np.mean(self.settle_times))
+        return self.window
+
+    def wait(self, read_position, read_sensor=None):
+        """
+        :param read_position: Returns the position [deg] of the motor.
+        :param read_sensor: Returns a sensor reading. The sensor is not checked if None.
+        :return: True if the motor settled, False if the wait ended by the timeout.
+        """
+        start = self.clock.time()
+        if self.mode == 'fixed':
+            self.clock.sleep(self.fixed_time)
+            self.settle_times.append(self.clock.time() - start)
+            return True
+
+        position = read_position()
+        sensor = read_sensor() if read_sensor is not None else None
+        window_start = start
+        while True:
+            now = self.clock.time()
+            if now - window_start >= self.window:
+                settled = True
+                break
+            if now - start >= self.timeout:
+                settled = False
+                break
+            self.clock.sleep(self.poll_interval)
+            new_position = read_position()
+            new_sensor = read_sensor() if read_sensor is not None else None
+            position_moved = _angle_difference(new_position, position) > self.position_tolerance
+            sensor_changed = sensor is not None and abs(new_sensor - sensor) > self.sensor_tolerance * abs(sensor)
+            if position_moved or sensor_changed:
+                # Start a new window from the new readings
+                position, sensor = new_position, new_sensor
+                window_start = self.clock.time()
+
+        settle_time = self.clock.time() - start
+        self.settle_times.append(settle_time)
+        if not settled:
+            self.timeouts += 1
+            logger.info(f'{log_this.space}Not settled within {self.timeout} s, continuing.')
+        return settled
+
+    def report(self):
+        """
+        :return: {"count", "mean", "max", "timeouts"} of the recorded settle times [s].
+        """
+        if not self.settle_times:
+            return {'count': 0, 'mean': 0.0, 'max': 0.0, 'timeouts': self.timeouts}
+        return {'count': len(self.settle_times),
+                'mean': float(np.mean(self.settle_times)),
+                'max': float(np.max(self.settle_times)),
+                'timeouts': self.timeouts}
@@ -0,0 +1,425 @@
+import time
+import math
+import queue
+import logging
+import threading
+
+import numpy as np
+
+from modules import _acquisition
+from modules import _kinematics
+from modules import parameters as param
+from modules.app_logger import log_this
+
+
+logger = logging.getLogger(__name__)
+
+
+class VirtualClock:
+    """
+    Clock of the simulated hardware. Simulated time runs "time_scale" times faster than the real time, so a scan of
+    10 hours with time_scale = 10000 takes under 4 seconds. With time_scale = 1 it is the wall clock.
+    """
+
+    def __init__(self, time_scale=param.simulation_time_scale):
+        self.time_scale = float(time_scale)
+        self._origin = time.time()
+        self._real_origin = time.perf_counter()
+
+    def __repr__(self):
+        return f'Virtual clock (x{self.time_scale})'
+
+    def time(self):
+        # Simulated time [s] since the epoch
+        return self._origin + (time.perf_counter() - self._real_origin) * self.time_scale
+
+    def sleep(self, seconds):
+        # Sleeps for "seconds" of the simulated time
+        if seconds > 0:
+            time.sleep(seconds / self.time_scale)
+
+    def set_time_scale(self, time_scale):
+        # Keep the simulated time continuous
+        now = self.time()
+        self.time_scale = float(time_scale)
+        self._origin = now
+        self._real_origin = time.perf_counter()
+
+
+# Kinesis message types and ids used by _Motor._while_moving_do()
+GENERIC_DEVICE = 0  # Message type of the status updates sent while polling
+GENERIC_MOTOR = 2  # Message type of the motion messages
+HOMED = 0
+MOVED = 1
+STOPPED = 2
+CHANNEL_ENABLED = 0x80000000  # Status bit of an enabled channel
+
+# HDR50 rotation stage on a BSC20x channel: 200 full steps x 128 micro-steps per motor revolution, 66:1 gearing.
+STEPS_PER_DEGREE = 200 * 128 * 66 / 360
+# The BSC20x controllers scale the velocity and the acceleration by the sampling interval of their trajectory
+# generator (APT communication protocol).
+TRAJECTORY_INTERVAL = 2048 / 6e6  # [s]
+VELOCITY_SCALE = STEPS_PER_DEGREE * TRAJECTORY_INTERVAL * 65536
+ACCELERATION_SCALE = STEPS_PER_DEGREE * TRAJECTORY_INTERVAL ** 2 * 65536
+
+
+class _SimulatedChannel:
+    """
+    State of one channel (motor) of the simulated controller. Positions are in [deg].
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.position = 0.0
+        self.velocity = 50.0
+        self.acceleration = 25.0003
+        self.homing_velocity = 6.0
+        self.homing_direction = 2
+        self.rotation_mode = 2  # 2: rotation over 0/360, 1: moves straight to the target (motor 2)
+        self.rotation_direction = 0  # 0: quickest, 1: forward, 2: reverse
+        self.messages = queue.Queue()
+        self.move = None  # (start time, start position, distance, velocity, acceleration) of the running move
+        self.move_count = 0  # Identifies the running move. A new command or a stop makes the older moves obsolete.
+        self.polling_count = 0  # Identifies the running polling thread
+        self.ready_time = 0.0  # When the channel becomes ready after opening the controller
+        self.lock = threading.Lock()
+
+    def position_at(self, now):
+        if self.move is None:
+            return self.position
+        start_time, start, distance, velocity, acceleration = self.move
+        travelled = _kinematics.trapezoidal_distance(now - start_time, distance, velocity, acceleration)
+        return self.wrap(start + math.copysign(travelled, distance))
+
+    def wrap(self, position):
+        return position % 360 if self.rotation_mode == 2 else position
+
+    def distance_to(self, position, target, direction):
+        if self.rotation_mode != 2:
+            return target - position
+        delta = (target - position) % 360
+        if direction == 1:
+            return delta
+        if direction == 2:
+            return delta - 360 if delta else 0.0
+        return delta if delta <= 180 else delta - 360
+
+
+class SimulatedBenchtopStepperMotor:
+    """
+    In-process stand-in for the msl-equipment BenchtopStepperMotor (Kinesis) used as MotorController.active_controller.
+    Implements the calls of _Motor: motion with the trapezoidal velocity profile, Kinesis-like message queues
+    (status updates while polling, Moved/Homed/Stopped when a motion ends), device unit conversions of the HDR50 stage
+    and a configurable latency of every call. Runs on a VirtualClock, so the real _Motor logic can be exercised and
+    profiled without the hardware, faster than real time.
+    """
+
+    def __init__(self, clock, latency=param.simulated_controller_latency, startup=param.simulated_controller_startup,
+                 number_of_channels=3):
+        """
+        :param startup: [s] Until the channels are ready. Opening the controller does not wait, like SBC_Open.
+        """
+        self.clock = clock
+        self.latency = latency  # [s] of the simulated time added to every call (USB round trip)
+        self._channels = {channel: _SimulatedChannel(channel) for channel in range(1, number_of_channels + 1)}
+        for state in self._channels.values():
+            state.ready_time = clock.time() + startup
+        self.calls = 0  # Number of calls to the controller
+
+    def __repr__(self):
+        return f'Simulated BSC203 ({len(self._channels)} channels)'
+
+    def _call(self, channel):
+        self.calls += 1
+        self.clock.sleep(self.latency)
+        return self._channels[channel]
+
+    # Connection
+    def load_settings(self, channel):
+        self._call(channel)
+
+    def request_status_bits(self, channel):
+        self._call(channel)
+
+    def get_status_bits(self, channel):
+        state = self._call(channel)
+        return CHANNEL_ENABLED if self.clock.time() >= state.ready_time else 0
+
+    def disconnect(self):
+        for channel in self._channels.values():
+            channel.polling_count += 1  # Ends the polling threads
+
+    # Messages
+    def start_polling(self, channel, milliseconds):
+        state = self._call(channel)
+        state.polling_count += 1
+        threading.Thread(target=self._poll, args=(state, state.polling_count, milliseconds),
+                         name=f'simulated-polling-{channel}', daemon=True).start()
+
+    def _poll(self, state, polling_count, milliseconds):
+        while state.polling_count == polling_count:
+            self.clock.sleep(milliseconds / 1000)
+            state.messages.put((GENERIC_DEVICE, 0, 0))  # Status update
+
+    def stop_polling(self, channel):
+        self._call(channel).polling_count += 1
+
+    def clear_message_queue(self, channel):
+        messages = self._call(channel).messages
+        while not messages.empty():
+            messages.get_nowait()
+
+    def wait_for_message(self, channel):
+        # Blocks until the next message like the Kinesis function. (message type, message id, message data)
+        message = self._channels[channel].messages.get()
+        self._call(channel)
+        return message
+
+    # Unit conversions
+    @staticmethod
+    def _scale(unit_type):
+        return {'DISTANCE': STEPS_PER_DEGREE, 'VELOCITY': VELOCITY_SCALE, 'ACCELERATION': ACCELERATION_SCALE}[unit_type]
+
+    def get_real_value_from_device_unit(self, channel, device_value, unit_type):
+        self._call(channel)
+        return device_value / self._scale(unit_type)
+
+    def get_device_unit_from_real_value(self, channel, real_value, unit_type):
+        self._call(channel)
+        return int(round(real_value * self._scale(unit_type)))
+
+    # Parameters
+    def get_position(self, channel):
+        state = self._call(channel)
+        with state.lock:
+            return int(round(state.position_at(self.clock.time()) * STEPS_PER_DEGREE))
+
+    def get_vel_params(self, channel):
+        state = self._call(channel)
+        return int(round(state.velocity * VELOCITY_SCALE)), int(round(state.acceleration * ACCELERATION_SCALE))
+
+    def set_vel_params(self, channel, velocity, acceleration):
+        state = self._call(channel)
+        state.velocity = velocity / VELOCITY_SCALE
+        state.acceleration = acceleration / ACCELERATION_SCALE
+
+    def get_homing_velocity(self, channel):
+        return int(round(self._call(channel).homing_velocity * VELOCITY_SCALE))
+
+    def set_homing_params_block(self, channel, direction, limit, velocity, offset):
+        state = self._call(channel)
+        state.homing_direction = direction
+        state.homing_velocity = velocity / VELOCITY_SCALE
+
+    def set_rotation_modes(self, channel, mode, direction):
+        state = self._call(channel)
+        state.rotation_mode = mode
+        state.rotation_direction = direction
+
+    def get_soft_limit_mode(self, channel):
+        self._call(channel)
+        return 0  # DisallowIllegalMoves
+
+    def get_stage_axis_min_pos(self, channel):
+        self._call(channel)
+        return 0
+
+    def get_stage_axis_max_pos(self, channel):
+        self._call(channel)
+        return int(round(360 * STEPS_PER_DEGREE))
+
+    # Motion
+    def _start_move(self, state, target, direction, velocity, acceleration, message_id):
+        now = self.clock.time()
+        with state.lock:
+            state.position = state.position_at(now)
+            distance = state.distance_to(state.position, target, direction)
+            state.move = (now, state.position, distance, velocity, acceleration)
+            state.move_count += 1
+            move_count = state.move_count
+        duration = _kinematics.trapezoidal_move_time(distance, velocity, acceleration)
+        threading.Thread(target=self._finish_move, args=(state, move_count, duration, message_id),
+                         name=f'simulated-move-{state.channel}', daemon=True).start()
+
+    def _finish_move(self, state, move_count, duration, message_id):
+        self.clock.sleep(duration + self.latency)
+        with state.lock:
+            if state.move_count != move_count:
+                return  # Stopped or replaced by another command
+            _, start, distance, _, _ = state.move
+            state.position = state.wrap(start + distance)
+            state.move = None
+        state.messages.put((GENERIC_MOTOR, message_id, 0))
+
+    def move_to_position(self, channel, position):
+        state = self._call(channel)
+        self._start_move(state, position / STEPS_PER_DEGREE, state.rotation_direction, state.velocity,
+                         state.acceleration, MOVED)
+
+    def home(self, channel):
+        # Runs to the home switch at 0 with the homing velocity. The homing offset is not simulated.
+        state = self._call(channel)
+        direction = state.homing_direction if state.rotation_mode == 2 else 0
+        self._start_move(state, 0.0, direction, state.homing_velocity, state.acceleration, HOMED)
+
+    def stop_profiled(self, channel):
+        state = self._call(channel)
+        with state.lock:
+            state.position = state.position_at(self.clock.time())
+            state.move = None
+            state.move_count += 1
+        state.messages.put((GENERIC_MOTOR, STOPPED, 0))
+
+
+def _angle_from_normal(position):
+    # Motors 1 and 3 are legal from 270 through 0 to 90 [deg]. Signed angle [deg] from the normal of the sample.
+    position = np.asarray(position, dtype=float) % 360
+    return np.where(position > 180, position - 360, position)
+
+
+class ScatteringModel:
+    """
+    BRDF-like model of the light scattered by the sample, as a function of the motor positions:
+        motor 1 ... angle of incidence, motor 2 ... rotation of the sample (azimuth), motor 3 ... angle of the detector
+    a0 (scattered light) is a Gaussian specular lobe around the mirror direction of the incident beam plus a diffuse
+    (Lambertian) lobe, modulated by the azimuthal anisotropy of the surface. a1 is the reference channel of the source.
+    The source intensity fluctuates the same way in both channels (it cancels out in data_ratio), every channel adds
+    its own noise. The noise comes from a seeded generator, so the same seed produces the same measurements.
+    """
+
+    def __init__(self, seed=param.simulated_sensor_seed, reference_level=250.0, specular_amplitude=150.0,
+                 specular_width=3.0, diffuse_amplitude=40.0, anisotropy=0.2, dark_level=2.0, source_noise=0.01,
+                 detector_noise=0.02, reference_noise=0.005):
+        """
+        :param reference_level: Mean value of a1.
+        :param specular_amplitude: Peak of the specular lobe of a0 above the diffuse part.
+        :param specular_width: Standard deviation [deg] of the specular lobe.
+        :param diffuse_amplitude: a0 at normal incidence and detection from the diffuse part.
+        :param anisotropy: Relative modulation of a0 with twice the azimuth (motor 2).
+        :param dark_level: a0 without any light.
+        :param source_noise: Relative noise of the source, common to both channels.
+        :param detector_noise: Relative noise of a0.
+        :param reference_noise: Relative noise of a1.
+        """
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.reference_level = reference_level
+        self.specular_amplitude = specular_amplitude
+        self.specular_width = specular_width
+        self.diffuse_amplitude = diffuse_amplitude
+        self.anisotropy = anisotropy
+        self.dark_level = dark_level
+        self.source_noise = source_noise
+        self.detector_noise = detector_noise
+        self.reference_noise = reference_noise
+
+    def __repr__(self):
+        return f'Scattering model (seed {self.seed})'
+
+    def mean_signal(self, motor_1_position, motor_2_position, motor_3_position):
+        """
+        :return: Noise-free a0 and a1 at the motor positions [deg]. Accepts numpy arrays.
+        """
+        incidence = _angle_from_normal(motor_1_position)
+        detection = _angle_from_normal(motor_3_position)
+        specular = self.specular_amplitude * np.exp(-0.5 * ((detection + incidence) / self.specular_width) ** 2)
+        diffuse = self.diffuse_amplitude * np.cos(np.radians(incidence)) * np.cos(np.radians(detection))
+        azimuth = 1 + self.anisotropy * np.cos(2 * np.radians(motor_2_position))
+        a0 = self.dark_level + (specular + np.clip(diffuse, 0, None)) * azimuth
+        return a0, np.full_like(a0, self.reference_level)
+
+    def sample(self, positions, number_of_samples):
+        """
+        :param positions: Motor 1, 2, 3 positions [deg] during the samples.
+        :return: Array of shape (number_of_samples, 3) with the columns a0, a1, data_ratio.
+        """
+        a0_mean, a1_mean = self.mean_signal(*positions)
+        source = 1 + self.source_noise * self.rng.standard_normal(number_of_samples)
+        samples = np.empty((number_of_samples, 3))
+        samples[:, 0] = a0_mean * source * (1 + self.detector_noise * self.rng.standard_normal(number_of_samples))
+        samples[:, 1] = a1_mean * source * (1 + self.reference_noise * self.rng.standard_normal(number_of_samples))
+        samples[:, 2] = samples[:, 0] / samples[:, 1]
+        return samples
+
+
+class SimulatedSensor:
+    """
+    Stand-in for the myDAQ measuring the scattering model at the current motor positions (see Sensor.set_simulation).
+    One-shot measurements take "latency" of the simulated time, like creating a nidaqmx task for every reading.
+    """
+
+    def __init__(self, positions, clock, model=None, latency=param.simulated_sensor_latency):
+        """
+        :param positions: Function returning the current motor 1, 2, 3 positions [deg].
+        :param clock: VirtualClock of the simulation.
+        :param model: ScatteringModel. Seeded by param.simulated_sensor_seed by default.
+        """
+        self.positions = positions
+        self.clock = clock
+        self.model = model if model is not None else ScatteringModel()
+        self.latency = latency
+
+    def __repr__(self):
+        return f'Simulated sensor ({self.model})'
+
+    def measure(self):
+        # :return: a0, a1 of one one-shot measurement.
+        self.clock.sleep(self.latency)
+        sample = self.model.sample(self.positions(), 1)[0]
+        return sample[0], sample[1]
+
+    def create_acquisition(self):
+        return SimulatedAcquisition(self)
+
+
+class SimulatedAcquisition(_acquisition.ContinuousAcquisition):
+    """
+    Continuous acquisition of the simulated sensor. A thread generates the samples at the sampling rate of the
+    simulated time and stores them into the ring buffer the same way the nidaqmx callback does.
+    """
+
+    def __init__(self, sensor, **kwargs):
+        super().__init__(**kwargs)
+        self.sensor = sensor
+        self.clock = sensor.clock
+        self._thread = None
+        self._running = False
+        self._clock_start = None
+
+    def __repr__(self):
+        return f'Simulated continuous acquisition [{self.sampling_rate} Hz]'
+
+    @property
+    def is_running(self):
+        return self._running
+
+    @log_this
+    def start(self):
+        self._running = True
+        self.start_time = time.perf_counter()
+        self._clock_start = self.clock.time()
+        self._thread = threading.Thread(target=self._generate, name='simulated-acquisition', daemon=True)
+        self._thread.start()
+        logger.info(f'{log_this.space}{self} started.')
+
+    @log_this
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        logger.info(f'{log_this.space}{self} stopped.')
+
+    def _generate(self):
+        generated = 0
+        while self._running:
+            due = int((self.clock.time() - self._clock_start) * self.sampling_rate)
+            if due > generated:
+                samples = self.sensor.model.sample(self.sensor.positions(), due - generated)
+                self._store_block(samples[:, :2].T)
+                generated = due
+            self.clock.sleep(self.read_chunk / self.sampling_rate)
+
+    def sample_time(self, index):
+        # perf_counter() time like the real acquisition, the samples are spaced by the simulated sampling period.
+        return self.start_time + np.asarray(index) / (self.sampling_rate * self.clock.time_scale)
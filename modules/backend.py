@@ -3,12 +3,13 @@ import math
 import os
 import time
 import random
-import warnings
 import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # Math libraries:
 import numpy as np
-import pandas as pd
 
 # Hardware libraries
 #   Motors:
@@ -25,7 +26,15 @@ from nidaqmx.constants import Edge, AcquisitionType
 
 # Custom modules:
 from modules import _scan
+from modules import _scan_journal
+from modules import _acquisition
+from modules import _sample_statistics
 from modules import _calibration
+from modules import _simulation
+from modules import _kinematics
+from modules import _scan_planner
+from modules import _scan_timing
+from modules import _settle
 from modules import parameters as param
 from modules.app_logger import log_this
 
@@ -34,6 +43,8 @@ logger = logging.getLogger(__name__)
 
 
 # Non-editable parameters
+CHANNEL_ENABLED = 0x80000000  # Status bit of an enabled channel (Kinesis SBC_GetStatusBits)
+
 motor_1_limits = (param.motor_1_limits[0] - param.limit_margin,
                   param.motor_1_limits[1] + param.limit_margin)
 
@@ -44,6 +55,33 @@ motor_3_limits = (param.motor_3_limits[0] - param.limit_margin,
                   param.motor_3_limits[1] + param.limit_margin)
 
 
+class _SerializedController:
+    """
+    Passes the calls to the BenchtopStepperMotor (Kinesis) one at a time. The motors of move_all() and of connect()
+    share one device handle from several threads, so every call holds the lock of the controller, except
+    wait_for_message: it blocks until the next message of its own channel, so the channels wait side by side (and
+    stop_profiled can interrupt a waiting move).
+    """
+    unlocked_calls = ('wait_for_message',)
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.lock = threading.RLock()
+
+    def __repr__(self):
+        return repr(self.controller)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.controller, name)
+        if not callable(attribute) or name in self.unlocked_calls:
+            return attribute
+
+        def serialized_call(*args, **kwargs):
+            with self.lock:
+                return attribute(*args, **kwargs)
+        return serialized_call
+
+
 class MotorController:
     """
     Class representing the motor controller hardware. Through this class you can control the motor setup as a whole set.
@@ -66,7 +104,11 @@ class MotorController:
             manufacturer=self._manufacturer, model=self._model,  # update for your device
             serial=self._serial,  # update for your device
             connection=ConnectionRecord(address=self._address, backend=self._backend))
-        self.active_controller = None  # The instance of BenchtopStepperMotor class. Needs to be initiated by connect().
+        # The instance of BenchtopStepperMotor class (behind _SerializedController). Needs to be initiated by connect().
+        self.active_controller = None
+        self.clock = _simulation.VirtualClock()  # Time of the virtual motors (wall clock unless sped up)
+        self.timer = _scan_timing.PhaseTimer(self.clock)  # Time spent in the phases of the last scan or calibration
+        self.connection_timing = {}  # Time spent in the phases of the last connect() (see PhaseTimer.report())
         # There are 3 motors in our setup, so we add a variable for each motor. Motors get assigned by connect().
         # Before connecting the motors are declared as _VirtualMotor() class.
         self.motor_1 = _VirtualMotor(self, 1, motor_1_limits)
@@ -78,7 +120,8 @@ class MotorController:
         self.sensor = Sensor()
 
         # Measurement parameters
-        self.scan_strategy = _scan.Scan3D(self)
+        self.scan_order = param.scan_order
+        self.scan_strategy = _scan.Scan3D(self, self.scan_order)
         self.scan_type = '3D'  # Or '2D'
         self.measurement_data = []
 
@@ -87,29 +130,55 @@ class MotorController:
 
     # This function is crashing the code if no device is plugged in via USB
     @log_this
-    def connect(self):
+    def connect(self, simulated=param.simulate_hardware):
         """
         Creates the instance of BenchtopStepperMotor and opens it for communication.
         Allows us to access the 3 motors connected to BenchtopStepperMotor channels 1, 2, 3.
         The device has to be connected by USB to connect successfully.
 
+        :param simulated: Connect to the simulated BenchtopStepperMotor and sensor (see _simulation) instead of the
+            hardware.
         :return: 0 if connection was successful, 1 if connection was not successful
         """
+        connection_timer = _scan_timing.PhaseTimer(self.clock)
+        connection_start = self.clock.time()
+        with connection_timer.measure('sensor'):
+            if simulated:
+                self.simulate_sensor()
+            if param.sensor_continuous_acquisition:
+                self.sensor.start_continuous_acquisition()  # The sensor is independent of the motor controller
 
         try:  # Has to be in try block in case USB is not connected
-            MotionControl.build_device_list()  # Collect closed devices connected by USB
-            logger.info(f'{log_this.space}Device list built successfully.')
+            if simulated:
+                with connection_timer.measure('open'):
+                    self.active_controller = _SerializedController(
+                        _simulation.SimulatedBenchtopStepperMotor(self.clock))
+                logger.info(f'{log_this.space}Connected to {self.active_controller} (time scale {self.clock}).')
+            else:
+                with connection_timer.measure('device list'):
+                    MotionControl.build_device_list()  # Collect closed devices connected by USB
+                logger.info(f'{log_this.space}Device list built successfully.')
 
-            self.active_controller = self._record.connect()  # This creates the instance of BenchtopStepperMotor
-            logger.info(f'{log_this.space}Record set up successfully.')
-            time.sleep(1)  # Leave some time for connection to establish correctly
+                with connection_timer.measure('open'):
+                    # This creates the instance of BenchtopStepperMotor. Every channel waits until it is ready
+                    # (see _Motor._wait_until_ready()) when its settings are loaded.
+                    self.active_controller = _SerializedController(self._record.connect())
+                logger.info(f'{log_this.space}Record set up successfully.')
+                self.clock.set_time_scale(1)  # The real hardware runs in real time
 
             # Connection to hardware was successful, therefore declare motors as _Motor() class.
-            self.motor_1 = _Motor(self, 1, motor_1_limits)
-            self.motor_2 = _Motor(self, 2, motor_2_limits)
-            self.motor_3 = _Motor(self, 3, motor_3_limits)
+            # The channels are independent, so their settings are loaded at the same time.
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                futures = [executor.submit(self._create_motor, motor_id, limits, connection_timer)
+                           for motor_id, limits in ((1, motor_1_limits), (2, motor_2_limits), (3, motor_3_limits))]
+            # result() re-raises the exception of a failed channel
+            self.motor_1, self.motor_2, self.motor_3 = (future.result() for future in futures)
             self.motors = [None, self.motor_1, self.motor_2, self.motor_3]
-            logger.info(f'{log_this.space}Connected to hardware successfully.')
+            connection_timer.add('total', self.clock.time() - connection_start, 0.0)
+            self.connection_timing = connection_timer.report()
+            logger.info(f'{log_this.space}Connected to hardware successfully in '
+                        f'{round(self.connection_timing["total"]["clock_total"], 3)} s.')
+            connection_timer.log_report()
 
             return 0
         except OSError:
@@ -119,6 +188,10 @@ class MotorController:
             logger.info(f'{log_this.space}Warning: Connected to virtual controller.')
             return 1
 
+    def _create_motor(self, motor_id, limits, connection_timer):
+        with connection_timer.measure(f'motor {motor_id}'):
+            return _Motor(self, motor_id, limits)
+
     @log_this
     def disconnect(self):
         """
@@ -126,9 +199,15 @@ class MotorController:
 
         :return: None
         """
+        self.sensor.stop_continuous_acquisition()
         if self.active_controller is not None:
+            # Close the port only when the channels are quiet: no polling and no motor still moving. The close itself
+            # (SBC_Close) returns when the port is closed, so nothing is left to wait for afterwards.
+            for motor in self.motors[1:]:
+                if isinstance(motor, _Motor):
+                    motor._stop_polling()
+                    motor.wait_until_settled()
             self.active_controller.disconnect()
-            time.sleep(1)  # To make sure the serial communication is handled properly
             self.active_controller = None  # Remove the controller
             # Remove the motors
             self.motor_1 = None
@@ -137,36 +216,67 @@ class MotorController:
             self.motors = [None, self.motor_1, self.motor_2, self.motor_3]
         logger.info(f'{log_this.space}Controller disconnected.')
 
-    def collect_sensor_data(self):
-        n = 0
+    def _motor_positions(self):
+        # The motors are None between disconnect() and the end of connect(), the simulated sensor keeps measuring
+        return tuple(motor.current_position if motor is not None else 0.0
+                     for motor in (self.motor_1, self.motor_2, self.motor_3))
 
-        column_names = ["motor_1_position", "motor_2_position", "motor_3_position", "a0", "a1", "data_ratio"]
-        scan_data_cluster = pd.DataFrame(columns=column_names)
+    @log_this
+    def simulate_sensor(self, model=None):
+        """
+        Replaces the myDAQ by the simulated sensor measuring the scattering model at the current motor positions.
 
-        while n < self.sensor.number_of_measurement_points:
-            self.sensor.toggle_graph_2D_timer.emit()
+        :param model: _simulation.ScatteringModel. Default model seeded by param.simulated_sensor_seed if None.
+        :return: None
+        """
+        self.sensor.set_simulation(_simulation.SimulatedSensor(self._motor_positions, self.clock, model))
+
+    def _measure_into(self, accumulator, number_of_samples):
+        if self.sensor.acquisition is not None:
+            # Continuous mode: take the whole block from the ring buffer at once.
+            self.sensor.toggle_graph_timer()
+            samples = self.sensor.measure_samples(number_of_samples)
+            self.sensor.toggle_graph_timer()
+            accumulator.add_block(self._motor_positions(), samples)
+            return
+
+        # One-shot fallback
+        for _ in range(number_of_samples):
+            self.sensor.toggle_graph_timer()
             sensor_data = self.sensor.measure_scattering()
-            self.sensor.toggle_graph_2D_timer.emit()
+            self.sensor.toggle_graph_timer()
+            accumulator.add(self._motor_positions(), sensor_data)
 
-            data_n = {
-                "motor_1_position": self.motor_1.current_position,
-                "motor_2_position": self.motor_2.current_position,
-                "motor_3_position": self.motor_3.current_position,
-                "a0": [sensor_data[0]],
-                "a1": [sensor_data[1]],
-                "data_ratio": [sensor_data[2]]}
-            current_scan = pd.DataFrame(data_n)  # Get data from n-th scan
-            scan_data_cluster = pd.concat((scan_data_cluster, current_scan), axis=0)  # Append current scan to previous
+    def acquire_sensor_samples(self):
+        """
+        Measures the samples at the current position.
 
-            # To prevent pandas FutureWarning spam:
-            warnings.simplefilter(action='ignore', category=FutureWarning)
+        :return: SampleAccumulator with the samples and the motor positions.
+        """
+        max_samples = self.sensor.number_of_measurement_points
+        if self.sensor.adaptive_sampling:
+            # Measure at least min_measurement_points, then add samples until the readings are precise enough.
+            min_samples = min(self.sensor.min_measurement_points, max_samples)
+        else:
+            min_samples = max_samples
+        accumulator = _sample_statistics.SampleAccumulator(max_samples)
 
-            n += 1
+        self._measure_into(accumulator, min_samples)
+        while (accumulator.count < max_samples and
+               not accumulator.is_precise(self.sensor.adaptive_target_relative_error)):
+            self._measure_into(accumulator, min(param.adaptive_check_interval, max_samples - accumulator.count))
+        return accumulator
 
-        # Now, each column has n number of values => get average value for every column
-        scan_output = scan_data_cluster.mean()
+    def reduce_sensor_data(self, accumulator):
+        """
+        Reduces the samples of one position and stores the result for the graphs. Does not touch the hardware, so it
+        can run while the motors are already moving to the next position.
 
-        scan_output['data_ratio'] = scan_output['data_ratio']
+        :param accumulator: SampleAccumulator returned by acquire_sensor_samples().
+        :return: Summary of the samples (pd.Series).
+        """
+        # Now, each column has n number of values => get average value for every column
+        scan_output = accumulator.summary()
         ''' Example of scan output:
         motor_1_position       0.0
         motor_2_position      90.0
@@ -174,24 +284,102 @@ class MotorController:
         a0                55.614
         a1                249.95
         data_ratio           0.277
+        a0_std             8.121
+        a1_std            99.853
+        data_ratio_std     0.143
+        sample_count       500.0
         '''
-        self.measurement_data.append({'motor_1_position': self.motor_1.current_position,
-                                      'motor_2_position': self.motor_2.current_position,
-                                      'motor_3_position': self.motor_3.current_position,
-                                      'a0': scan_output.iloc[3],
-                                      'a1': scan_output.iloc[4]})
+        # Positions at the time of the measurement. The motors might be somewhere else by now.
+        self.measurement_data.append({'motor_1_position': scan_output['motor_1_position'],
+                                      'motor_2_position': scan_output['motor_2_position'],
+                                      'motor_3_position': scan_output['motor_3_position'],
+                                      'a0': scan_output['a0'],
+                                      'a1': scan_output['a1'],
+                                      'sample_count': accumulator.count})
 
         return scan_output
 
+    def collect_sensor_data(self):
+        return self.reduce_sensor_data(self.acquire_sensor_samples())
+
+    def motors_stopped(self):
+        return any(motor.stopped for motor in self.motors[1:] if motor is not None)
+
+    @log_this
+    def move_all(self, targets):
+        """
+        Moves the motors at the same time. The BSC203 channels are independent, so every motor runs its own move,
+        waits for its own completion message and handles its own limits in a separate thread.
+        The repositioning takes as long as the slowest axis instead of the sum of all of them.
+
+        :param targets: Target positions of the motors 1, 2, 3. None keeps the motor where it is.
+        :return: List of move_to_position results of the motors 1, 2, 3 (None for the motors which did not move).
+        """
+        moves = {motor.motor_id: (motor, target) for motor, target in zip(self.motors[1:], targets)
+                 if target is not None}
+        if len(moves) <= 1:
+            return [moves[motor_id][0].move_to_position(moves[motor_id][1]) if motor_id in moves else None
+                    for motor_id in (1, 2, 3)]
+
+        with ThreadPoolExecutor(max_workers=len(moves)) as executor:
+            futures = {motor_id: executor.submit(motor.move_to_position, target)
+                       for motor_id, (motor, target) in moves.items()}
+        # result() re-raises the exception of a failed move
+        return [futures[motor_id].result() if motor_id in futures else None for motor_id in (1, 2, 3)]
+
+    def _reset_timing(self):
+        self.timer.reset()
+        for motor in self.motors[1:]:
+            if motor is not None:
+                motor.settle_detector.reset()
+
+    def _log_timing(self):
+        # Time per phase and the settle times of every motor, for tuning the scan parameters
+        self.timer.log_report()
+        for motor in self.motors[1:]:
+            if motor is not None:
+                settle = motor.settle_detector.report()
+                logger.info(f'{log_this.space}Motor {motor.motor_id} settle: {settle["count"]}x, mean '
+                            f'{round(settle["mean"], 3)} s, max {round(settle["max"], 3)} s, '
+                            f'{settle["timeouts"]} timeouts')
+
     @log_this
     def calibrate(self):
         self.measurement_data.clear()
+        self._reset_timing()
         _calibration.calibration(self)
+        self._log_timing()
 
     @log_this
     def scan(self, thread_signal_progress_status):
         self.measurement_data.clear()
+        self._reset_timing()
         self.scan_strategy.start_scanning(thread_signal_progress_status)
+        self._log_timing()
+
+    @log_this
+    def resume(self, journal_path, thread_signal_progress_status):
+        """
+        Continues an interrupted step scan from its last checkpoint. The finished points are skipped and the new
+        points are appended to the same output files.
+
+        :param journal_path: Journal of the scan ("<output file name>journal.jsonl" next to the output files).
+        :return: None
+        """
+        state = _scan_journal.load_journal(journal_path)
+        logger.info(f'{log_this.space}Scan journal: {state}')
+        if state.finished:
+            logger.info(f'{log_this.space}The scan is already finished. Nothing to resume.')
+            return
+        scan_strategies = {'Scan3D': _scan.Scan3D, 'Scan1D': _scan.Scan1D}
+        if state.scan_type not in scan_strategies:
+            raise ValueError(f'{state.scan_type} can not be resumed. Only {", ".join(scan_strategies)} can.')
+        self.measurement_data.clear()
+        self._reset_timing()
+        scan_strategy = scan_strategies[state.scan_type](self)
+        scan_strategy.resume_from(state)
+        scan_strategy.start_scanning(thread_signal_progress_status)
+        self._log_timing()
 
     @log_this
     def stop_motors(self):
@@ -200,7 +388,10 @@ class MotorController:
             if isinstance(motor, _Motor):
                 logger.info(f'{log_this.space}Stopping motor: {motor.motor_id}')
                 motor.stop()
-        time.sleep(1)  # To ensure proper communication through USB
+        # Wait for the motors to come to rest (stop_profiled decelerates) to ensure proper communication through USB
+        for motor in self.motors:
+            if isinstance(motor, _Motor):
+                motor.wait_until_settled()
 
     @log_this
     def unstop_motors(self):
@@ -213,8 +404,17 @@ class MotorController:
     def set_scan_type(self, scan_type: str):
         if scan_type == "1D":
             self.scan_strategy = _scan.Scan1D(self)
+        elif scan_type == "1D fly":
+            self.scan_strategy = _scan.FlyScan1D(self)
         elif scan_type == "3D":
-            self.scan_strategy = _scan.Scan3D(self)
+            self.scan_strategy = _scan.Scan3D(self, self.scan_order)
+
+    @log_this
+    def set_scan_order(self, scan_order: str):
+        # Order in which the 3D scan visits its points: 'raster', 'serpentine' or 'optimal'
+        self.scan_order = scan_order
+        if isinstance(self.scan_strategy, _scan.Scan3D) and not isinstance(self.scan_strategy, _scan.Scan1D):
+            self.scan_strategy.scan_order = scan_order
 
 
 class _Motor:
@@ -231,7 +431,14 @@ class _Motor:
         self._polling_rate = polling_rate
         self.hardware_limits = hardware_limits  # Max angle of rotation in degrees
         self.parent_controller = parent.active_controller
+        self.clock = parent.clock  # Real time for the hardware, simulated time for the simulated controller
+        self.settle_detector = _settle.SettleDetector(self.clock)
+        self.motion_monitor = _MotionMonitor(self)
         self.settings_loaded = False
+        # Parameters cached after _load_settings(), so the moves don't ask the controller for what it was told before
+        self._unit_scales = {}  # {unit type: device units per real unit}, see _load_unit_scales()
+        self._velocity_parameters = None  # (velocity, acceleration) in real units, cached by get_velocity()
+        self._rotation_mode = None  # (mode, direction) last set by set_rotation_mode()
 
         self._load_settings()
 
@@ -241,6 +448,7 @@ class _Motor:
         self.reached_right_limit = False
         self.current_position = 0
         self.stopped = False
+        self.position_trace = None  # List of (time.perf_counter(), position [deg]) while tracing, see fly scan
 
         # Motor 2 has different hardware limits than motor 1 and 3. Therefore, setup motor 2 separately:
         if self.motor_id == 2:
@@ -248,9 +456,7 @@ class _Motor:
             self._set_backwards_homing()  # Always home anticlockwise
 
         # Measurement parameters
-        self.scan_from = 0
-        self.scan_to = 90
-        self.scan_step = 30
+        self.scan_from, self.scan_to, self.scan_step = param.scan_range
         self.scan_positions = self.find_range(self.scan_from, self.scan_to, self.scan_step)
 
     def __repr__(self):
@@ -275,27 +481,37 @@ class _Motor:
 
     def _while_moving_do(self, value: int):
         # Works in combination with polling. "start polling, wait, stop polling" to perform tasks while moving.
-        self.parent_controller.clear_message_queue(self.motor_id)
+        # The message queue is cleared before the command is sent, so a quick move can't lose its "moved" message.
+        monitor = self.motion_monitor
+        monitor.start()
         message_type, message_id, _ = self.parent_controller.wait_for_message(self.motor_id)
+        monitor.messages += 1
 
         # Loop until the motor reaches the desired position and changes message type then stop while loop.
         while message_type != 2 or message_id != value:
             message_type, message_id, _ = self.parent_controller.wait_for_message(self.motor_id)
+            monitor.messages += 1
             # Your code in the loop starts here:
-            # Check if the motors are stopped
+            # Check if the motors are stopped. A stopped motor never sends the message of the finished move.
             if self.stopped:
-                logger.info(f"{log_this.space}Can't move. Motor is stopped.")
+                logger.info(f"{log_this.space}Motor {self.motor_id} is stopped. Leaving the move.")
+                break
 
             # Gather information about the movement and resolve illegal movements
             self.is_moving = True
 
-            position = self.get_position()
+            check_limits = value != 0 and monitor.limit_check_due()  # Homing does not check the limits
+            if not check_limits and not monitor.update_due():
+                continue  # Nothing needs the position at this status message
+
+            position = monitor.read_position()
             self.current_position = position[1]
+            self._trace_position()
 
-            movement_direction = self._check_for_movement_direction(position[1])
-            illegal_position = self.check_for_illegal_position(position[1])
+            illegal_position = check_limits and self.check_for_illegal_position(position[1])
 
-            if illegal_position and value != 0:
+            if illegal_position:
+                movement_direction = monitor.direction
                 if abs(position[1] - self.hardware_limits[1]) < abs(position[1] - self.hardware_limits[0]) \
                         and movement_direction == 'FORWARD':
                     self.stop()
@@ -319,13 +535,45 @@ class _Motor:
         if self.motor_id != 2:
             self.set_rotation_mode(mode=2, direction=0)  # Return to quickest pathing mode
 
-        time.sleep(0.5)  # To ensure proper communication and placement of the parts. Maybe could be shorter time.
+        self.wait_until_settled()  # To ensure proper communication and placement of the parts.
 
         # Mark the last position
         position = self.get_position()
         self.current_position = position[1]
+        self._trace_position()
         logger.info(f'{log_this.space}Motor {self.motor_id} At position {position[0]} [device units] {position[1]} '
                     f'[real-world units]')
+        logger.info(f'{log_this.space}Motor {self.motor_id} status messages: {monitor.messages}, position reads: '
+                    f'{monitor.position_reads}')
+
+    def wait_until_settled(self):
+        """
+        Waits until the motor is settled after a move or a stop (see _settle.SettleDetector).
+
+        :return: True if the motor settled, False if the wait ended by the timeout.
+        """
+        read_sensor = self._read_sensor if param.settle_on_sensor else None
+        with self._parent.timer.measure('settle'):
+            return self.settle_detector.wait(self._read_position, read_sensor)
+
+    def _read_position(self):
+        return self.get_position()[1]
+
+    def _read_sensor(self):
+        return self._parent.sensor.measure_scattering()[2]
+
+    def _trace_position(self):
+        if self.position_trace is not None:
+            self.position_trace.append((time.perf_counter(), self.current_position))
+
+    def start_position_trace(self):
+        # Records the polled positions of the following moves with their time stamps.
+        self.position_trace = [(time.perf_counter(), self.current_position)]
+
+    def stop_position_trace(self):
+        trace = self.position_trace
+        self.position_trace = None
+        return trace
 
     def _load_settings(self):
         """
@@ -333,13 +581,66 @@ class _Motor:
         It is called when creating the motor instance in __init__() when used MotorController.connect().
         :return:
         """
-        self.parent_controller.load_settings(self.motor_id)
         # The SBC_Open(serialNo) function in Kinesis is non-blocking, and therefore we
-        # Should add a delay for Kinesis to establish communication with the serial port
-        time.sleep(1)
+        # Should wait for Kinesis to establish communication with the serial port
+        self._wait_until_ready()
+        self.parent_controller.load_settings(self.motor_id)
+        # Loaded with the settings
+        self._velocity_parameters = None
+        self._rotation_mode = None
+        self._wait_until_ready()
         self.settings_loaded = True
+        self._load_unit_scales()
         logger.info(f'{log_this.space}Motor {self.motor_id} setting loaded.')
 
+    def _wait_until_ready(self, timeout=param.connect_timeout):
+        """
+        Polls the status of the channel until it reports itself enabled, instead of waiting a fixed time.
+
+        :return: True if the channel is ready, False if the wait ended by the timeout.
+        """
+        start = self.clock.time()
+        while True:
+            self.parent_controller.request_status_bits(self.motor_id)
+            if self.parent_controller.get_status_bits(self.motor_id) & CHANNEL_ENABLED:
+                return True
+            if self.clock.time() - start >= timeout:
+                logger.info(f'{log_this.space}Motor {self.motor_id} is not ready after {timeout} s. Continuing.')
+                return False
+            self.clock.sleep(param.connect_poll_interval)
+
+    def _load_unit_scales(self):
+        # The conversions between the device units and the real units are linear and given by the loaded stage
+        # settings. Ask the controller once per unit type (a large device value keeps the rounding error negligible)
+        # instead of once per conversion.
+        reference = 10 ** 8  # [device units]
+        self._unit_scales = {
+            unit_type: reference / self.parent_controller.get_real_value_from_device_unit(self.motor_id, reference,
+                                                                                          unit_type)
+            for unit_type in ('DISTANCE', 'VELOCITY', 'ACCELERATION')}
+
+    def to_real_value(self, device_value, unit_type):
+        """
+        :param unit_type: 'DISTANCE', 'VELOCITY' or 'ACCELERATION'.
+        :return: Real value of the device value, converted with the cached conversion factor.
+        """
+        return device_value / self._unit_scales[unit_type]
+
+    def to_device_unit(self, real_value, unit_type):
+        """
+        :param unit_type: 'DISTANCE', 'VELOCITY' or 'ACCELERATION'.
+        :return: Device units (int) of the real value, converted with the cached conversion factor.
+        """
+        return int(round(real_value * self._unit_scales[unit_type]))
+
+    @property
+    def polling_rate(self):
+        return self._polling_rate
+
+    def set_polling_rate(self, rate):
+        # [ms] Polling rate used by the following moves.
+        self._polling_rate = rate
+
     def _start_polling(self, rate=200):
         self.parent_controller.start_polling(self.motor_id, rate)
 
@@ -349,57 +650,36 @@ class _Motor:
     def get_position(self):
         if self.settings_loaded:
             position_device_unit = self.parent_controller.get_position(self.motor_id)
-            position_real_unit = self.parent_controller.get_real_value_from_device_unit(
-                self.motor_id, position_device_unit, "DISTANCE")
+            position_real_unit = self.to_real_value(position_device_unit, "DISTANCE")
             return position_device_unit, position_real_unit
         else:
             return logger.info(f'{log_this.space}Settings need to be loaded first.')
 
     def get_velocity(self):
         # Default value for movement: vel = 50.0 deg/s, acc = 25.0003 deg/s/s  TODO: double check the units
-        velocity_d_u, acceleration_d_u = self.parent_controller.get_vel_params(self.motor_id)
-        velocity_real = self.parent_controller.get_real_value_from_device_unit(
-            self.motor_id, velocity_d_u, "VELOCITY")
-        acceleration_real = self.parent_controller.get_real_value_from_device_unit(
-            self.motor_id, acceleration_d_u, "ACCELERATION")
-        return velocity_real, acceleration_real
+        # Read from the device once, then kept up to date by set_velocity().
+        if self._velocity_parameters is None:
+            velocity_d_u, acceleration_d_u = self.parent_controller.get_vel_params(self.motor_id)
+            velocity_real = self.to_real_value(velocity_d_u, "VELOCITY")
+            acceleration_real = self.to_real_value(acceleration_d_u, "ACCELERATION")
+            self._velocity_parameters = (velocity_real, acceleration_real)
+        return self._velocity_parameters
 
     def get_travel_time(self, distance):
-        # THIS METHOD IS NOT USED YET
-        velocity = self.get_velocity()[0]
-        acceleration = self.get_velocity()[1]
-        current_velocity = 0.01
-        travel_time = 0
-        distance_needed_to_stop = 0
-        traveled_distance = 0
-        dt = 0.1
-        while traveled_distance <= distance - distance_needed_to_stop:
-            while current_velocity <= velocity and traveled_distance <= distance - distance_needed_to_stop:
-                # Acceleration
-                current_velocity = math.sqrt(2 * acceleration * travel_time)
-                time.sleep(dt)
-                travel_time = travel_time + dt
-                traveled_distance = traveled_distance + current_velocity * dt
-                distance_needed_to_stop = current_velocity / 2 / acceleration
-            # Constant speed
-            traveled_distance = traveled_distance + current_velocity * dt
-            time.sleep(dt)
-            travel_time = travel_time + dt
-            distance_needed_to_stop = current_velocity / 2 / acceleration
-
-        while current_velocity >= 0:
-            # Deceleration
-            traveled_distance = traveled_distance + current_velocity * dt
-            current_velocity = current_velocity - 2 * acceleration * dt
-
-        return travel_time, traveled_distance
+        """
+        Closed-form duration of a move with the current velocity parameters (trapezoidal velocity profile, triangular
+        for short moves). Does not include the settle time.
+
+        :param distance: [deg]
+        :return: Travel time [s].
+        """
+        velocity, acceleration = self.get_velocity()
+        return _kinematics.trapezoidal_move_time(distance, velocity, acceleration)
 
     def get_homing_velocity(self):
         if self.settings_loaded:
             velocity_device_units = self.parent_controller.get_homing_velocity(self.motor_id)
-            velocity_real_units = self.parent_controller.get_real_value_from_device_unit(self.motor_id,
-                                                                                         velocity_device_units,
-                                                                                         "VELOCITY")
+            velocity_real_units = self.to_real_value(velocity_device_units, "VELOCITY")
             return velocity_real_units, velocity_device_units
         else:
             return logger.info(f'{log_this.space}Settings need to be loaded first.')
@@ -416,12 +696,8 @@ class _Motor:
         # Call only after "load_settings()"
         min_angle_d_u = self.parent_controller.get_stage_axis_min_pos(self.motor_id)
         max_angle_d_u = self.parent_controller.get_stage_axis_max_pos(self.motor_id)
-        min_angle_r_u = self.parent_controller.get_real_value_from_device_unit(self.motor_id,
-                                                                               min_angle_d_u,
-                                                                               'DISTANCE')
-        max_angle_r_u = self.parent_controller.get_real_value_from_device_unit(self.motor_id,
-                                                                               max_angle_d_u,
-                                                                               'DISTANCE')
+        min_angle_r_u = self.to_real_value(min_angle_d_u, 'DISTANCE')
+        max_angle_r_u = self.to_real_value(max_angle_d_u, 'DISTANCE')
         return min_angle_r_u, max_angle_r_u
 
     def get_location_quadrant(self, target_location=None):
@@ -462,12 +738,13 @@ class _Motor:
                 # logger.info(left_limit, target_position, right_limit)
                 return True
 
-    def _check_for_movement_direction(self, previous_position):
-        new_position = self.get_position()[1]
-        if new_position > previous_position:
-            return 'FORWARD'
-        elif new_position < previous_position:
-            return 'BACKWARD'
+    def distance_to_limits(self, position):
+        # [deg] Distance of the position from the nearer hardware limit along the legal arc (0 outside of it).
+        if self.check_for_illegal_position(position):
+            return 0.0
+        coordinate = float(_scan_planner.legal_arc_coordinate(self, position))
+        start = float(_scan_planner.legal_arc_coordinate(self, self.hardware_limits[0]))
+        return min(coordinate - start, start + float(_scan_planner.legal_arc_length(self)) - coordinate)
 
     def find_range(self, start, stop, step):
         # TODO: Test all range options and fix illegal combinations (m3 from 270 to 90 etc...)
@@ -497,17 +774,18 @@ class _Motor:
         #   2 ... reverse
         # Does not affect homing directions
         if self.settings_loaded:
+            if self._rotation_mode == (mode, direction):
+                return  # Already set
             self.parent_controller.set_rotation_modes(self.motor_id, mode, direction)
+            self._rotation_mode = (mode, direction)
         else:
             return logger.info(f'{log_this.space}Settings need to be loaded first.')
 
     def set_homing_parameters(self, direction, limit, velocity, offset):
         # direction: int ...
         if self.settings_loaded:
-            velocity_device_units = self.parent_controller.get_device_unit_from_real_value(self.motor_id, velocity,
-                                                                                           "VELOCITY")
-            offset_device_units = self.parent_controller.get_device_unit_from_real_value(self.motor_id, offset,
-                                                                                         "DISTANCE")
+            velocity_device_units = self.to_device_unit(velocity, "VELOCITY")
+            offset_device_units = self.to_device_unit(offset, "DISTANCE")
             self.parent_controller.set_homing_params_block(
                 self.motor_id, direction, limit, velocity_device_units, offset_device_units)
         else:
@@ -529,14 +807,13 @@ class _Motor:
 
     def set_velocity(self, velocity=20, acceleration=30):
         # Velocity over 10 is already very fast to keep up with polling rate 200ms
-        velocity_device_units = self.parent_controller.get_device_unit_from_real_value(self.motor_id,
-                                                                                       velocity,
-                                                                                       "VELOCITY")
-        acceleration_device_units = self.parent_controller.get_device_unit_from_real_value(self.motor_id,
-                                                                                           acceleration,
-                                                                                           "ACCELERATION")
+        if self.get_velocity() == (velocity, acceleration):
+            return  # Already set, e.g. the default velocity parameters reset after every move
+        velocity_device_units = self.to_device_unit(velocity, "VELOCITY")
+        acceleration_device_units = self.to_device_unit(acceleration, "ACCELERATION")
 
         self.parent_controller.set_vel_params(self.motor_id, velocity_device_units, acceleration_device_units)
+        self._velocity_parameters = (velocity, acceleration)
 
     def set_measurement_parameters(self, scan_from=None, scan_to=None, scan_step=None):
         # Check for illegal positions:
@@ -576,8 +853,9 @@ class _Motor:
         elif self.motor_id == 2:
             self.move_to_position(10)
 
-        time.sleep(0.5)  # To make sure that controller has not been disconnected in the meantime.
+        self.wait_until_settled()  # To make sure that controller has not been disconnected in the meantime.
 
+        self.parent_controller.clear_message_queue(self.motor_id)
         self._start_polling(rate=self._polling_rate)
         self.parent_controller.home(self.motor_id)
         logger.info(f'{log_this.space}Homing motor {self.motor_id}...')
@@ -597,33 +875,33 @@ class _Motor:
         if self.stopped:
             return 1
         illegal_position = self.check_for_illegal_position(position)
-        logger.info(f'{log_this.space}Velocity: {self.get_velocity()[0]}, Acceleration: {self.get_velocity()[1]}')
+        velocity, acceleration = self.get_velocity()
+        logger.info(f'{log_this.space}Velocity: {velocity}, Acceleration: {acceleration}')
         if not illegal_position:
-            self._start_polling()
-            position_in_device_unit = self.parent_controller.get_device_unit_from_real_value(self.motor_id,
-                                                                                             position,
-                                                                                             'DISTANCE')
+            self.parent_controller.clear_message_queue(self.motor_id)
+            self._start_polling(rate=self._polling_rate)
+            position_in_device_unit = self.to_device_unit(position, 'DISTANCE')
             start_time = time.time()
             self.parent_controller.move_to_position(self.motor_id, position_in_device_unit)
             self._while_moving_do(1)
             self._stop_polling()
             end_time = time.time()
             duration = abs(end_time - start_time)
-            logger.info(f'{log_this.space}Movement duration:', duration)
+            logger.info(f'{log_this.space}Movement duration: {duration}')
 
             if self.motor_id != 2:
                 if self.reached_left_limit and not self.is_moving:
                     logger.info(f'{log_this.space}Left limit handling')
                     self.set_velocity(velocity=10, acceleration=20)
                     self.set_rotation_mode(mode=2, direction=1)  # Forward direction
-                    time.sleep(1)
+                    self.wait_until_settled()  # The stop at the limit has to finish first
                     self.reached_left_limit = False
                     self.move_to_position(position)  # Rotate clockwise
                 elif self.reached_right_limit:
                     logger.info(f'{log_this.space}Right limit handling')
                     self.set_velocity(velocity=10, acceleration=20)
                     self.set_rotation_mode(mode=2, direction=2)  # Forward direction
-                    time.sleep(1)
+                    self.wait_until_settled()  # The stop at the limit has to finish first
                     self.reached_right_limit = False
                     self.move_to_position(position)  # Rotate anticlockwise
         else:
@@ -641,16 +919,74 @@ class _Motor:
         logger.info(f'{log_this.space}Motor {self.motor_id} stopped.')
 
 
+class _MotionMonitor:
+    """
+    Follows the moves of a motor from its status messages with as few reads of the controller as possible.
+    The latest read positions are cached: the movement direction comes from the two latest samples, and the position is
+    read only when it is needed: the motor may have reached the illegal zone since the last sample (limit check), the
+    position is traced (fly scan), or the displayed position is older than param.motion_monitor_refresh.
+    """
+
+    def __init__(self, motor):
+        self.motor = motor
+        self.samples = deque(maxlen=2)  # (time, position [deg]) of the latest reads
+        self.messages = 0  # Status messages of the last move
+        self.position_reads = 0  # Reads of the position during the last move
+
+    def __repr__(self):
+        return f'Motion monitor of motor {self.motor.motor_id}'
+
+    def start(self):
+        # Call before every move. The move starts where the last one ended.
+        self.samples.clear()
+        self.samples.append((self.motor.clock.time(), self.motor.current_position))
+        self.messages = 0
+        self.position_reads = 0
+
+    def read_position(self):
+        position = self.motor.get_position()
+        self.position_reads += 1
+        self.samples.append((self.motor.clock.time(), position[1]))
+        return position
+
+    @property
+    def direction(self):
+        # 'FORWARD', 'BACKWARD' or None between the two latest samples
+        if len(self.samples) < 2:
+            return None
+        (_, previous_position), (_, position) = self.samples
+        if position > previous_position:
+            return 'FORWARD'
+        elif position < previous_position:
+            return 'BACKWARD'
+
+    def limit_check_due(self):
+        # Could the motor have reached the illegal zone since the last sample? Assumes at most twice the velocity
+        # until the next status message.
+        sample_time, position = self.samples[-1]
+        velocity, _ = self.motor.get_velocity()
+        elapsed_time = self.motor.clock.time() - sample_time + self.motor.polling_rate / 1000
+        return self.motor.distance_to_limits(position) <= 2 * abs(velocity) * elapsed_time
+
+    def update_due(self):
+        if self.motor.position_trace is not None:
+            return True
+        return self.motor.clock.time() - self.samples[-1][0] >= param.motion_monitor_refresh
+
+
 class _VirtualMotor(_Motor):
     """
     Class representing the virtual motors. In case the hardware is not connected.
     This class is used mainly for developing purposes and debugging.
+    The moves follow the trapezoidal velocity profile given by set_velocity() and end with the settle time, like the real
+    motors. They run on the clock of the controller, so with a sped-up clock a long scan is simulated in seconds.
     """
 
     def __init__(self, parent: MotorController, motor_id: int, hardware_limits: tuple, polling_rate=200):
+        self._move = None  # (start time, start coordinate, distance, velocity, acceleration) of the running move
         super().__init__(parent, motor_id, hardware_limits, polling_rate)
-        self.current_velocity = 20
-        self.current_acceleration = 30
+        self.current_velocity = 50  # Default velocity parameters of the real motors
+        self.current_acceleration = 25
 
     def __repr__(self):
         return f'Motor {self.motor_id}'
@@ -660,7 +996,39 @@ class _VirtualMotor(_Motor):
         logger.info(f'{log_this.space}Motor {self.motor_id} setting loaded.')
 
     def get_position(self):
-        return self.current_position
+        move = self._move
+        if move is None:
+            return self.current_position
+        return self._position_during_move(move, self.clock.time() - move[0])
+
+    def _position_during_move(self, move, elapsed_time):
+        _, start, distance, velocity, acceleration = move
+        travelled = _kinematics.trapezoidal_distance(elapsed_time, distance, velocity, acceleration)
+        return float(_scan_planner.position_from_legal_arc_coordinate(self, start + math.copysign(travelled, distance)))
+
+    def _travel(self, position):
+        # Moves along the legal arc of the motor, updating the position every polling period of the simulated time.
+        start = float(_scan_planner.legal_arc_coordinate(self, self.current_position))
+        distance = float(_scan_planner.legal_arc_coordinate(self, position)) - start
+        duration = _kinematics.trapezoidal_move_time(distance, self.current_velocity, self.current_acceleration)
+        move = (self.clock.time(), start, distance, self.current_velocity, self.current_acceleration)
+        self._move = move
+        self.is_moving = True
+        while True:
+            elapsed_time = self.clock.time() - move[0]
+            self.current_position = self._position_during_move(move, elapsed_time)
+            self._trace_position()
+            if elapsed_time >= duration or self.stopped:
+                break
+            self.clock.sleep(min(self._polling_rate / 1000, duration - elapsed_time))
+        self._move = None
+        self.is_moving = False
+
+        self.set_velocity(velocity=50, acceleration=25)  # Set default velocity parameters like the real motor
+        self.wait_until_settled()
+
+    def _read_position(self):
+        return self.get_position()
 
     def get_velocity(self):
         return self.current_velocity, self.current_acceleration
@@ -682,8 +1050,9 @@ class _VirtualMotor(_Motor):
     def home(self, velocity=10):
         if self.stopped:
             return logger.info(f"{log_this.space}Motors are stopped. Aborting...")
-        time.sleep(1)
-        self.current_position = 0
+        # Homing runs at the homing velocity towards the home switch at 0
+        self.set_velocity(velocity=velocity, acceleration=self.current_acceleration)
+        self._travel(0)
         logger.info(f'{log_this.space}Motor {self.motor_id} homed.')
 
     @log_this
@@ -691,10 +1060,11 @@ class _VirtualMotor(_Motor):
         if self.stopped:
             logger.info(f"{log_this.space}Can't move. Motor is stopped.")
             return 1
-        time.sleep(1)
-        # logger.info(self.get_travel_time(abs(position)-self.get_position()))
-        self.current_position = position
-        logger.info(f'{log_this.space}Motor {self.motor_id} moved to {position}.')
+        if self.check_for_illegal_position(position):
+            logger.info(f'{log_this.space}Movement would result in illegal position')
+            return
+        self._travel(position)
+        logger.info(f'{log_this.space}Motor {self.motor_id} moved to {self.current_position}.')
 
     @log_this
     def stop(self):
@@ -711,15 +1081,86 @@ class Sensor:
         self.a1_history = [0.0]
         self.max_value_a0 = 0
         self.max_value_a1 = 0
-        self.number_of_measurement_points = 500
+        # Upper bound of the samples per position in adaptive mode
+        self.number_of_measurement_points = param.measurement_points
+        self.adaptive_sampling = param.adaptive_sampling
+        self.adaptive_target_relative_error = param.adaptive_target_relative_error
+        self.min_measurement_points = param.adaptive_min_samples
+        self.acquisition = None  # ContinuousAcquisition instance while the continuous mode is running.
+        self.simulation = None  # SimulatedSensor measuring instead of the myDAQ (see _simulation)
         self.measure_scattering()  # Obtain initial values
         self.toggle_graph_2D_timer = None  # Gets assigned in GUI
 
+    def start_continuous_acquisition(self):
+        """
+        Starts streaming the sensor channels into a ring buffer. While running, measurements only read the buffer.
+
+        :return: 0 if the continuous acquisition is running, 1 if the one-shot measurements are used instead.
+        """
+        if self.acquisition is not None:
+            return 0
+        if self.simulation is not None:
+            acquisition = self.simulation.create_acquisition()
+        else:
+            acquisition = _acquisition.ContinuousAcquisition()
+        try:
+            acquisition.start()
+        except (nidaqmx.errors.DaqNotFoundError, nidaqmx.DaqError):
+            logger.info(f'{log_this.space}Continuous acquisition is not available. Using one-shot measurements.')
+            return 1
+        self.acquisition = acquisition
+        return 0
+
+    def set_simulation(self, simulation):
+        """
+        :param simulation: SimulatedSensor to measure instead of the myDAQ. None to measure with the myDAQ again.
+        :return: None
+        """
+        was_running = self.acquisition is not None
+        self.stop_continuous_acquisition()
+        self.simulation = simulation
+        logger.info(f'{log_this.space}Sensor: {simulation if simulation is not None else "myDAQ"}')
+        if was_running:
+            self.start_continuous_acquisition()
+
+    def stop_continuous_acquisition(self):
+        if self.acquisition is not None:
+            acquisition = self.acquisition
+            self.acquisition = None
+            try:
+                acquisition.stop()
+            except nidaqmx.DaqError as e:
+                logger.info(f'{log_this.space}Continuous acquisition could not be stopped cleanly: {e}')
+
+    def _store_measurement(self, a0, a1):
+        self.current_a0 = float(a0)
+        self.current_a1 = float(a1)
+        # Save only last 5 (history_length) values
+        if len(self.a0_history) > self.history_length:
+            self.a0_history = self.a0_history[1:]
+        if len(self.a1_history) > self.history_length:
+            self.a1_history = self.a1_history[1:]
+        self.a0_history.append(self.current_a0)
+        self.a1_history.append(self.current_a1)
+        if self.current_a0 > self.max_value_a0:
+            self.max_value_a0 = self.current_a0
+        data_ratio = self.current_a0 / self.current_a1
+        return self.current_a0, self.current_a1, data_ratio
+
     def measure_scattering(self):
+        if self.acquisition is not None:
+            # Continuous mode: the newest sample is already in the buffer.
+            sample = self.acquisition.latest()
+            if sample is not None:
+                return self._store_measurement(sample[0], sample[1])
+
+        if self.simulation is not None:
+            return self._store_measurement(*self.simulation.measure())
+
         try:
             with nidaqmx.Task() as task:
                 task.ai_channels.add_ai_voltage_chan(
-                    "myDAQ1/ai0:1"
+                    param.sensor_channels
                 )
                 task.timing.cfg_samp_clk_timing(
                     100000,
@@ -730,35 +1171,48 @@ class Sensor:
                 )
 
                 sensor_data = task.read()
-                self.current_a0 = float(sensor_data[0])
-                self.current_a1 = float(sensor_data[1])
-                # Save only last 5 (history_length) values
-                if len(self.a0_history) > self.history_length:
-                    self.a0_history = self.a0_history[1:]
-                if len(self.a1_history) > self.history_length:
-                    self.a1_history = self.a0_history[1:]
-                self.a0_history.append(self.current_a0)
-                self.a1_history.append(self.current_a1)
-                if self.current_a0 > self.max_value_a0:
-                    self.max_value_a0 = self.current_a0
-                data_ratio = self.current_a0 / self.current_a1
-                return self.current_a0, self.current_a1, data_ratio
+                return self._store_measurement(sensor_data[0], sensor_data[1])
 
         except (nidaqmx.errors.DaqNotFoundError, nidaqmx.DaqError):
             # This part is for debugging, when accessing measurement without the hardware.
             # The type of the nidaqmx.error to except seems to be changing based on which PC the program runs on.
-            self.current_a0 = random.randint(42, 70)
-            self.current_a1 = random.randint(71, 420)
-            if len(self.a0_history) > self.history_length:
-                self.a0_history = self.a0_history[1:]
-            if len(self.a1_history) > self.history_length:
-                self.a1_history = self.a0_history[1:]
-            self.a0_history.append(self.current_a0)
-            self.a1_history.append(self.current_a1)
-            if self.current_a0 > self.max_value_a0:
-                self.max_value_a0 = self.current_a0
-            data_ratio = self.current_a0 / self.current_a1
-            return self.current_a0, self.current_a1, data_ratio
+            return self._store_measurement(random.randint(42, 70), random.randint(71, 420))
+
+    def toggle_graph_timer(self):
+        # Pauses or resumes the real-time graph of the GUI around a measurement. Nothing to do without the GUI.
+        if self.toggle_graph_2D_timer is not None:
+            self.toggle_graph_2D_timer.emit()
+
+    def estimated_acquisition_time(self):
+        # Rough duration [s] of measuring one position (the upper bound of the samples in the adaptive mode)
+        if self.acquisition is not None:
+            return self.number_of_measurement_points / self.acquisition.sampling_rate
+        if self.simulation is not None:
+            return self.number_of_measurement_points * self.simulation.latency
+        return self.number_of_measurement_points * param.sensor_one_shot_duration
+
+    def measure_samples(self, number_of_samples):
+        """
+        Measures a block of samples. Slices the ring buffer when the continuous acquisition is running,
+        otherwise falls back to one-shot measurements.
+
+        :param number_of_samples: How many samples to measure.
+        :return: Array of shape (number_of_samples, 3) with the columns a0, a1, data_ratio.
+        """
+        if self.acquisition is not None:
+            try:
+                samples = self.acquisition.read(number_of_samples)
+                self._store_measurement(samples[-1, 0], samples[-1, 1])
+                self.max_value_a0 = max(self.max_value_a0, float(samples[:, 0].max()))
+                return samples
+            except (nidaqmx.DaqError, TimeoutError, ValueError) as e:
+                logger.info(f'{log_this.space}Continuous acquisition failed ({e}). Using one-shot measurements.')
+                self.stop_continuous_acquisition()
+
+        samples = np.empty((number_of_samples, 3))
+        for n in range(number_of_samples):
+            samples[n] = self.measure_scattering()
+        return samples
 
     def get_last_measurement(self):
         return self.a0_history[-1], self.a1_history[-1], self.a0_history[-1] / self.a1_history[-1]
@@ -766,11 +1220,38 @@ class Sensor:
     def set_number_of_measurement_points(self, value):
         self.number_of_measurement_points = int(value)
 
+    def set_adaptive_sampling(self, enabled, target_relative_error=None, min_measurement_points=None):
+        self.adaptive_sampling = bool(enabled)
+        if target_relative_error is not None:
+            self.adaptive_target_relative_error = float(target_relative_error)
+        if min_measurement_points is not None:
+            self.min_measurement_points = int(min_measurement_points)
+
+
+# Motor controller object based on the hardware in the lab. Created on first use (see get_motor_controller()), so
+# importing the module does not measure the sensor.
+_motor_controller = None
+_motor_controller_lock = threading.Lock()
 
-# Define motor controller object based on the hardware in the lab:
-motor_controller = MotorController(
-    manufacturer="Thorlabs",
-    model="BSC203",
-    serial="70224414",
-    address="SDK::Thorlabs.MotionControl.Benchtop.StepperMotor.dll",
-    backend=Backend.MSL)
+
+def get_motor_controller():
+    """
+    :return: The MotorController of the lab hardware, created on the first call.
+    """
+    global _motor_controller
+    with _motor_controller_lock:
+        if _motor_controller is None:
+            _motor_controller = MotorController(
+                manufacturer="Thorlabs",
+                model="BSC203",
+                serial="70224414",
+                address="SDK::Thorlabs.MotionControl.Benchtop.StepperMotor.dll",
+                backend=Backend.MSL)
+        return _motor_controller
+
+
+def __getattr__(name):
+    # "backend.motor_controller" and "from modules.backend import motor_controller" create the controller on first use
+    if name == 'motor_controller':
+        return get_motor_controller()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
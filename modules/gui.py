@@ -162,7 +162,8 @@ class Window(QMainWindow):
         self._calibration_m3_range_value = self._line_edit("10")
 
         int_validator = QIntValidator()
-        self._number_of_measurement_points_value = self._line_edit("500")
+        self._number_of_measurement_points_value = self._line_edit(
+            f"{motor_controller.sensor.number_of_measurement_points}")
         self._number_of_measurement_points_value.setValidator(int_validator)
         self._number_of_measurement_points_value.editingFinished.connect(
             lambda: motor_controller.sensor.set_number_of_measurement_points(
@@ -435,17 +436,27 @@ class Window(QMainWindow):
         elif self._measurement_1d.isChecked():
             self._measurement_1d.setEnabled(False)
 
-    def _update_progress_bar_label(self, finish_time):
+    def _update_progress_bar_label(self, finish_time, confidence_band=0.0):
         delta = timedelta(seconds=finish_time)
         (days, hours, minutes, seconds) = days_hours_minutes_seconds(delta)
         n = (str(days) + "d " + str(hours) + "h " + str(minutes) + "m " + str(seconds) + "s")
+        if confidence_band >= 1:
+            # Confidence band of the estimate, in the largest unit that keeps it readable
+            (days, hours, minutes, seconds) = days_hours_minutes_seconds(timedelta(seconds=confidence_band))
+            if days or hours:
+                n += " \u00b1 " + str(days * 24 + hours) + "h " + str(minutes) + "m"
+            elif minutes:
+                n += " \u00b1 " + str(minutes) + "m " + str(seconds) + "s"
+            else:
+                n += " \u00b1 " + str(seconds) + "s"
         self._time_to_finish_value_label.setText(n)
 
-    def _update_progress_bar(self, progress_status: list[int, float]):
+    def _update_progress_bar(self, progress_status: list[int, float, float]):
         progress = progress_status[0]
         finish_time = progress_status[1]
-        self._progress_bar.setValue(progress)
-        self._update_progress_bar_label(finish_time)
+        confidence_band = progress_status[2] if len(progress_status) > 2 else 0.0
+        self._progress_bar.setValue(int(progress))
+        self._update_progress_bar_label(finish_time, confidence_band)
 
     def keyPressEvent(self, event):
         # For safety reasons, if any motor is moving and any key is pressed, all the motors stop.
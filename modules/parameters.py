@@ -16,6 +16,9 @@ default_log_config: str = 'default_log_config.json'
 
 # Motor parameters
 global_polling_rate = 200
+connect_timeout = 3  # [s] How long connect() waits for a channel of the controller to report itself ready.
+connect_poll_interval = 0.02  # [s]
+motion_monitor_refresh = 0.5  # [s] How often the position is read during a move just for the display.
 motor_1_limits = (270, 90)  # (Counter-Clockwise, Clockwise) limits of the motor 1 in [deg].
 motor_2_limits = (0, 270)  # (Counter-Clockwise, Clockwise) limits of the motor 2 in [deg].
 motor_3_limits = (270, 90)  # (Counter-Clockwise, Clockwise) limits of the motor 3 in [deg].
@@ -30,6 +33,18 @@ motor_1_acceleration = 25  # probably [deg/s/s]
 motor_2_acceleration = 25  # probably [deg/s/s]
 motor_3_acceleration = 25  # probably [deg/s/s]
 
+motor_settle_time = 0.5  # [s] Pause after every move to ensure proper communication and placement of the parts.
+# Settling after a move: 'fixed' waits motor_settle_time, 'adaptive' polls the position (and the sensor if
+# settle_on_sensor) until the readings stay within the tolerances for settle_window, at most settle_timeout.
+settle_mode = 'adaptive'
+settle_position_tolerance = 0.01  # [deg]
+settle_on_sensor = False  # Wait for the sensor reading to be stable too (e.g. vibrating sample holder).
+settle_sensor_tolerance = 0.02  # Allowed relative change of the sensor reading (data ratio) within the window.
+settle_window = 0.1  # [s]
+settle_timeout = 2  # [s]
+settle_poll_interval = 0.02  # [s]
+concurrent_moves = True  # Move the motors of a scan point at the same time (every BSC203 channel is independent).
+
 motor_1_homing_speed = 6  # probably [deg/s]
 motor_2_homing_speed = 6  # probably [deg/s]
 motor_3_homing_speed = 6  # probably [deg/s]
@@ -37,6 +52,59 @@ motor_3_homing_speed = 6  # probably [deg/s]
 forward_homing_offset = -6.5  # [deg]
 backwards_homing_offset = 3  # [deg]
 
+# Simulation (virtual motors when the controller is not connected)
+simulation_time_scale = 1  # The simulated hardware runs this many times faster than the real one.
+simulate_hardware = False  # Connect to a simulated BSC203 (runs the real motor code without the Thorlabs hardware).
+simulated_controller_latency = 0.002  # [s] Delay of every call to the simulated BSC203 (USB round trip).
+simulated_controller_startup = 0.3  # [s] Until the channels of the simulated BSC203 are ready after opening.
+simulated_sensor_seed = 0  # Seed of the noise of the simulated sensor. The same seed gives the same measurements.
+simulated_sensor_latency = 0.002  # [s] Duration of one simulated one-shot measurement (myDAQ task overhead).
+
+# Sensor parameters
+sensor_channels = "myDAQ1/ai0:1"  # Analog input channels of the myDAQ (a0, a1)
+sensor_continuous_acquisition = True  # Stream the sensor into a ring buffer instead of opening a task per reading.
+sensor_sampling_rate = 1000  # [Hz] Hardware-timed sampling rate of the continuous acquisition.
+sensor_buffer_size = 10000  # [samples per channel] Size of the ring buffer (10 s at 1 kHz).
+sensor_read_chunk = 50  # [samples per channel] How many samples are transferred from the driver at once.
+sensor_one_shot_duration = 0.01  # [s] Approximate duration of one one-shot measurement (for the duration estimates).
+
+# Adaptive sampling: keep measuring a position until the relative standard error (standard error / |mean|) of a0 and
+# data_ratio drops below the target. The number of measurement points set in the GUI is the upper bound.
+adaptive_sampling = False
+adaptive_target_relative_error = 0.002
+adaptive_min_samples = 50
+adaptive_check_interval = 25  # [samples] How often the stopping rule is evaluated.
+
+# Scan parameters
+# Scan range of every motor and measurement points per position until they are changed (GUI, scan file of the headless
+# runner). Every queued job starts from these, so a job does not inherit the settings of the previous one.
+scan_range = (0, 90, 30)  # [deg] from, to, step
+measurement_points = 500
+# 'raster', 'serpentine' (motor 3 and motor 2 reverse their direction on alternate passes) or 'optimal' (shortest
+# estimated move time found by the scan planner)
+scan_order = 'raster'
+planner_max_points = 2000  # Larger scans are not reordered point by point (the cost matrix grows quadratically).
+planner_max_passes = 20  # Improvement passes of the planner over the whole path.
+pipeline_queue_size = 16  # Measured points waiting for processing while the motors move on.
+writer_flush_rows = 20  # The output file is written and synced to the disk after this many rows...
+writer_flush_interval = 60  # [s] ...or at the latest after this time.
+# Output files of a scan: any of 'csv', 'hdf5' (needs h5py) and 'parquet' (needs pyarrow).
+# h5py and pyarrow are optional (not in requirements.txt), the formats are checked before the scan.
+# The binary formats store float64 columns and the scan metadata (motor ranges, steps, velocities, samples).
+scan_output_formats = ('csv',)
+# Remaining time of a scan: the measured duration of every phase (inner move, outer move, acquisition) corrects its
+# estimate. The correction starts at 1 as if "progress_prior_points" points had matched the estimate and then
+# follows the newest points with the weight "progress_smoothing".
+progress_smoothing = 0.1
+progress_prior_points = 5
+progress_prior_relative_std = 0.2  # Assumed scatter of the measured / estimated duration before any point is measured.
+progress_confidence = 1.96  # Half-width of the +- band of the remaining time in standard deviations (95 %).
+
+# Fly scan (1D): motor 3 sweeps at a constant velocity while the sensor streams, samples are binned by position.
+fly_scan_velocity = 2  # [deg/s] At 1 kHz sampling that is 500 samples per degree.
+fly_scan_acceleration = 25  # [deg/s/s]
+fly_scan_polling_rate = 50  # [ms] How often the motor position is polled during the sweep.
+
 # By default, use the default configuration of the logger. Edit this path if custom logger is provided.
 logger_config_path: Path = logging_configs_path / default_log_config
 
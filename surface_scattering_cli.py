@@ -0,0 +1,220 @@
+"""
+Headless scan runner. Runs a scan or the calibration described by a JSON file without the GUI (no Qt, no graphs), so
+batch scans start fast and spend nothing on rendering.
+
+Usage (from the root directory):
+    python surface_scattering_cli.py scan.json
+    python surface_scattering_cli.py scan.json --simulated
+    python surface_scattering_cli.py --resume DataOutput/data_3D/20250101_120000_000000_journal.jsonl
+
+Job queue (see modules/_job_queue.py), kept in a JSON file between the runs:
+    python surface_scattering_cli.py --queue jobs.json --add scan.json --priority 1 --calibration calibration.json
+    python surface_scattering_cli.py --queue jobs.json --list
+    python surface_scattering_cli.py --queue jobs.json --run
+
+Scan file: see validate_scan_config() in modules/_scan_config.py. Every key is optional, the defaults are those of
+parameters.py.
+
+Exit codes:
+    0  finished (every job of the queue)
+    1  the scan failed (a job of the queue failed, see the log)
+    2  invalid arguments, scan file or job queue (a queue mixing simulated jobs and jobs of the hardware)
+    3  the controller is not connected
+    4  the scan was stopped (motors stopped, Ctrl+C). A step scan can be resumed from its journal.
+"""
+
+
+import sys
+import logging
+import argparse
+from pathlib import Path
+from datetime import timedelta
+
+from modules.app_logger import log_this, setup_logging
+from modules import parameters as param
+from modules._job_queue import JobQueue, run_jobs
+from modules._scan_config import load_scan_config, apply_scan_config
+from utils.time_format_processing import days_hours_minutes_seconds
+
+
+logger = logging.getLogger(__name__)
+
+EXIT_FINISHED = 0
+EXIT_FAILED = 1
+EXIT_INVALID_CONFIG = 2  # Like the argument errors of argparse
+EXIT_NOT_CONNECTED = 3
+EXIT_STOPPED = 4
+
+class ConsoleProgress:
+    """
+    Prints the progress of a scan. Stands in for the Qt signal of the GUI progress bar (see Scan._update_progressbar).
+    """
+
+    def __init__(self, stream=sys.stderr):
+        self.stream = stream
+
+    def emit(self, progress_status):
+        progress, time_to_finish = progress_status[0], progress_status[1]
+        confidence_band = progress_status[2] if len(progress_status) > 2 else 0.0
+        (days, hours, minutes, seconds) = days_hours_minutes_seconds(timedelta(seconds=time_to_finish))
+        line = f'[{progress:5.1f} %] {days}d {hours}h {minutes}m {seconds}s left'
+        if confidence_band >= 1:
+            line += f' (+- {round(confidence_band)} s)'
+        print(line, file=self.stream, flush=True)
+
+
+def run(controller, config=None, journal_path=None, simulated=False, progress=None):
+    """
+    Connects, runs the scan (or resumes it from its journal) and disconnects.
+
+    :return: Exit code (see the module docstring).
+    """
+    simulated = simulated or (config is not None and config['simulated'])
+    if controller.connect(simulated=simulated) != 0:
+        logger.info(f'{log_this.space}The controller is not connected. Scan not started.')
+        return EXIT_NOT_CONNECTED
+    progress = progress if progress is not None else ConsoleProgress()
+    try:
+        if journal_path is not None:
+            controller.resume(journal_path, progress)
+        else:
+            apply_scan_config(controller, config)
+            if config['home']:
+                for motor in controller.motors[1:]:
+                    motor.home()
+            if config['scan_type'] == 'calibration':
+                controller.calibrate()
+            else:
+                controller.scan(progress)
+        if controller.motors_stopped():
+            logger.info(f'{log_this.space}The scan was stopped.')
+            return EXIT_STOPPED
+        return EXIT_FINISHED
+    except KeyboardInterrupt:
+        logger.info(f'{log_this.space}Interrupted. Stopping the motors...')
+        controller.stop_motors()
+        return EXIT_STOPPED
+    except Exception as e:
+        logger.exception(f'{log_this.space}Scan failed: {e}')
+        return EXIT_FAILED
+    finally:
+        controller.disconnect()
+
+
+def run_queue(controller, queue, simulated=False, progress=None):
+    """
+    Connects, runs the pending jobs of the queue and disconnects.
+
+    :return: Exit code (see the module docstring).
+    """
+    if controller.connect(simulated=simulated) != 0:
+        logger.info(f'{log_this.space}The controller is not connected. Job queue not started.')
+        return EXIT_NOT_CONNECTED
+    progress = progress if progress is not None else ConsoleProgress()
+    try:
+        results = run_jobs(controller, queue, progress, simulated)
+    except KeyboardInterrupt:
+        logger.info(f'{log_this.space}Interrupted. Stopping the motors...')
+        controller.stop_motors()
+        return EXIT_STOPPED
+    finally:
+        controller.disconnect()
+    logger.info(f'{log_this.space}Job queue: {results["done"]} done, {results["stopped"]} stopped, '
+                f'{results["failed"]} failed, {len(queue.pending())} pending.')
+    if results['stopped']:
+        return EXIT_STOPPED
+    if results['failed']:
+        return EXIT_FAILED
+    return EXIT_FINISHED
+
+
+def list_jobs(queue, stream=sys.stdout):
+    for job in queue.jobs:
+        line = f'{job.job_id:>4}  {job.state:<8} priority {job.priority:<3} {job.config["scan_type"]:<12}'
+        if job.config['simulated']:
+            line += ' simulated'
+        if job.calibration is not None:
+            line += ' with calibration'
+        if job.error is not None:
+            line += f' ({job.error})'
+        elif job.journal is not None:
+            line += f' (journal {job.journal})'
+        print(line.rstrip(), file=stream)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Runs a surface scattering scan without the GUI.')
+    parser.add_argument('config', nargs='?', type=Path, help='JSON scan file.')
+    parser.add_argument('--resume', type=Path, metavar='JOURNAL', help='Continue an interrupted scan from its journal.')
+    parser.add_argument('--queue', type=Path, metavar='QUEUE', help='JSON job queue file (created if missing).')
+    queue_action = parser.add_mutually_exclusive_group()
+    queue_action.add_argument('--add', type=Path, metavar='SCAN_FILE', help='Add a scan file to the job queue.')
+    queue_action.add_argument('--list', action='store_true', help='List the jobs of the queue.')
+    queue_action.add_argument('--run', action='store_true', help='Run the pending jobs of the queue.')
+    parser.add_argument('--priority', type=int, default=0, help='Priority of the added job, higher runs first.')
+    parser.add_argument('--calibration', type=Path, metavar='CAL_FILE',
+                        help='Calibration file run before the added job.')
+    parser.add_argument('--simulated', action='store_true', help='Run on the simulated hardware.')
+    parser.add_argument('--quiet', action='store_true', help='Print only the progress and the warnings.')
+    args = parser.parse_args(argv)
+    if sum(argument is not None for argument in (args.config, args.resume, args.queue)) != 1:
+        parser.error('Give either a scan file, --resume JOURNAL or --queue QUEUE.')
+    if args.queue is not None and not (args.add or args.list or args.run):
+        parser.error('--queue takes one of --add SCAN_FILE, --list or --run.')
+    if args.queue is None and (args.add or args.list or args.run):
+        parser.error('--add, --list and --run need --queue QUEUE.')
+
+    setup_logging(param.logger_config_path)
+    if args.quiet:
+        for handler in logging.getLogger().handlers:
+            if type(handler) is logging.StreamHandler:  # Console only, the log files stay complete
+                handler.setLevel(logging.WARNING)
+
+    config = None
+    if args.config is not None:
+        try:
+            config = load_scan_config(args.config)
+        except (OSError, ValueError) as e:  # json.JSONDecodeError is a ValueError
+            print(f'Invalid scan file {args.config}: {e}', file=sys.stderr)
+            return EXIT_INVALID_CONFIG
+
+    queue = None
+    if args.queue is not None:
+        try:
+            queue = JobQueue(args.queue)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f'Invalid job queue {args.queue}: {e}', file=sys.stderr)
+            return EXIT_INVALID_CONFIG
+        if args.add:
+            try:
+                calibration = load_scan_config(args.calibration) if args.calibration is not None else None
+                job = queue.add(load_scan_config(args.add), args.priority, calibration)
+            except (OSError, ValueError) as e:
+                print(f'Invalid scan file: {e}', file=sys.stderr)
+                return EXIT_INVALID_CONFIG
+            print(f'Added {job}', file=sys.stderr)
+            return EXIT_FINISHED
+        if args.list:
+            list_jobs(queue)
+            return EXIT_FINISHED
+        # One connection runs the whole queue, so its jobs have to agree on the hardware
+        modes = {job.config['simulated'] for job in queue.pending()}
+        if len(modes) > 1:
+            print(f'The job queue {args.queue} mixes simulated jobs and jobs of the hardware. Run them from separate '
+                  f'queues.', file=sys.stderr)
+            return EXIT_INVALID_CONFIG
+        if args.simulated and False in modes:
+            print(f'The jobs of {args.queue} are meant for the hardware, not for the simulated hardware (--simulated).',
+                  file=sys.stderr)
+            return EXIT_INVALID_CONFIG
+
+    logger.info(f'{log_this.space}Lunching Surface Scattering (headless)...')
+    from modules import backend  # Loads the hardware libraries
+    if queue is not None:
+        simulated = args.simulated or True in modes
+        return run_queue(backend.get_motor_controller(), queue, simulated)
+    return run(backend.get_motor_controller(), config, args.resume, args.simulated)
+
+
+if __name__ == '__main__':
+    sys.exit(main())